@@ -0,0 +1,52 @@
+import asyncio
+import os
+import secrets
+from dataclasses import asdict
+from typing import Optional
+from fastapi import Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from nicegui import app
+from app import tracing
+from app.profiler import DEFAULT_INTERVAL, SamplingProfiler
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.environ.get("APP_ADMIN_TOKEN", "")
+
+
+def check_admin_token(token: Optional[str], admin_token: Optional[str] = None) -> None:
+    """Reject requests without the admin token (defaults to APP_ADMIN_TOKEN)"""
+    expected = ADMIN_TOKEN if admin_token is None else admin_token
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if token is None or not secrets.compare_digest(token, expected):
+        raise HTTPException(status_code=403, detail="Forbidden")
+
+
+def create():
+    """Register the admin-only tracing and profiling endpoints"""
+
+    @app.get("/admin/traces")
+    async def recent_traces(trace_id: Optional[str] = None, x_admin_token: Optional[str] = Header(default=None)):
+        check_admin_token(x_admin_token)
+        exporter = tracing.EXPORTER
+        if not isinstance(exporter, tracing.InMemoryExporter):
+            raise HTTPException(status_code=409, detail="In-memory trace export is not enabled")
+        return [asdict(span) for span in exporter.spans(trace_id)]
+
+    @app.get("/admin/profile", response_class=PlainTextResponse)
+    async def profile(
+        seconds: float = 5.0, interval: float = DEFAULT_INTERVAL, x_admin_token: Optional[str] = Header(default=None)
+    ):
+        check_admin_token(x_admin_token)
+        try:
+            profiler = SamplingProfiler(interval)
+            # Sample from a worker thread so the event loop being profiled keeps serving requests
+            await asyncio.to_thread(profiler.run, seconds)
+        except ValueError as e:
+            logger.warning(f"Rejected profile request: {str(e)}")
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        logger.info(f"Collected {profiler.sample_count} profile samples over {seconds}s")
+        return profiler.collapsed()
@@ -0,0 +1,148 @@
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, Dict, TypeVar
+from nicegui import app
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class AdmissionRejectedError(RuntimeError):
+    """Raised when a call is rejected because too many calls are already running or waiting"""
+
+
+class AdmissionController:
+    """Bound the number of calls running at once and the number waiting for a slot.
+
+    Up to `max_in_flight` calls run concurrently and up to `max_queue` more wait in arrival order,
+    each for at most `queue_timeout` seconds. A call arriving at a full queue, or still waiting when its timeout
+    passes, is rejected with AdmissionRejectedError instead of piling up on the connection pool,
+    so the latency of every call stays bounded under overload.
+
+    Async code dispatches through `run_in_thread`, which turns calls away on the event loop before
+    they reach a thread, so no backlog builds up in an executor queue in front of the controller.
+    """
+
+    def __init__(self, name: str, max_in_flight: int = 8, max_queue: int = 32, queue_timeout: float = 0.25):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        if max_queue < 0:
+            raise ValueError("max_queue must not be negative")
+        self.name = name
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        # Waiting callers in arrival order; only the head may take a free slot
+        self._waiters: Deque[object] = deque()
+        self._dispatched = 0
+        # One thread per slot and queue place, so every dispatched call starts waiting for its slot at once
+        self._executor = ThreadPoolExecutor(max_in_flight + max_queue, thread_name_prefix=f"admission-{name}")
+        self._total_admitted = 0
+        self._total_rejections = 0
+
+    def call(self, func: Callable[[], T]) -> T:
+        """Run func once a slot is free, or raise AdmissionRejectedError"""
+        self._acquire()
+        try:
+            return func()
+        finally:
+            self._release()
+
+    async def run_in_thread(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run a blocking func that goes through `call` in a worker thread, or raise AdmissionRejectedError.
+
+        The check runs on the event loop: a call is turned away at once while every thread is taken or
+        the queue is full, instead of waiting in front of the controller where no timeout applies.
+        The caller's context goes with the call, so spans it opens belong to the caller's trace.
+        """
+        with self._condition:
+            queued = len(self._waiters)
+            queue_full = queued > 0 and queued >= self.max_queue
+            if queue_full or self._dispatched >= self.max_in_flight + self.max_queue:
+                self._total_rejections += 1
+                raise AdmissionRejectedError(f"'{self.name}' is busy: {self._dispatched} calls already dispatched")
+            self._dispatched += 1
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(context.run, self._run_dispatched, func, *args, **kwargs)
+        )
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current load and totals for health and metrics endpoints"""
+        with self._condition:
+            return {
+                "name": self.name,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "dispatched": self._dispatched,
+                "max_in_flight": self.max_in_flight,
+                "max_queue": self.max_queue,
+                "total_admitted": self._total_admitted,
+                "total_rejections": self._total_rejections,
+            }
+
+    def _run_dispatched(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._condition:
+                self._dispatched -= 1
+
+    def _acquire(self) -> None:
+        with self._condition:
+            if self._waiters or self._in_flight >= self.max_in_flight:
+                if len(self._waiters) >= self.max_queue:
+                    self._total_rejections += 1
+                    raise AdmissionRejectedError(f"'{self.name}' is busy: {len(self._waiters)} calls already waiting")
+                waiter = object()
+                self._waiters.append(waiter)
+                deadline = time.monotonic() + self.queue_timeout
+                try:
+                    # First come, first served: a newcomer never overtakes a caller that is already waiting
+                    while self._waiters[0] is not waiter or self._in_flight >= self.max_in_flight:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            self._total_rejections += 1
+                            raise AdmissionRejectedError(
+                                f"'{self.name}' is busy: no slot within {self.queue_timeout:.3f}s"
+                            )
+                        self._condition.wait(remaining)
+                finally:
+                    self._waiters.remove(waiter)
+                    # Wake the new head of the queue, which may find a slot free
+                    self._condition.notify_all()
+            self._in_flight += 1
+            self._total_admitted += 1
+
+    def _release(self) -> None:
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+
+# Counter writes; keep max_in_flight below the engine's pool size (5 + 10 overflow) so reads still get connections
+WRITE_ADMISSION = AdmissionController(
+    "counter_writes",
+    max_in_flight=int(os.environ.get("APP_WRITE_MAX_IN_FLIGHT", "8")),
+    max_queue=int(os.environ.get("APP_WRITE_MAX_QUEUE", "32")),
+    queue_timeout=float(os.environ.get("APP_WRITE_QUEUE_TIMEOUT_MS", "250")) / 1000,
+)
+
+
+def create():
+    """Register the admission metrics endpoint"""
+
+    @app.get("/metrics/admission")
+    async def admission_metrics():
+        return WRITE_ADMISSION.snapshot()
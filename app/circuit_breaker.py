@@ -0,0 +1,160 @@
+import os
+import threading
+import time
+from enum import Enum
+from typing import Any, Callable, Dict, Optional, Tuple, Type, TypeVar
+from sqlalchemy.exc import DBAPIError, OperationalError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CircuitState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised when a call is rejected because the circuit is open"""
+
+
+class CircuitBreaker:
+    """Fail fast after repeated failures or slow calls, probing periodically for recovery.
+
+    A call counts as a failure if it raises or takes longer than the latency budget.
+    After `failure_threshold` consecutive failures the circuit opens and calls are rejected
+    with CircuitOpenError. Once `reset_timeout` seconds have passed a single probe call is let
+    through (half-open); its outcome closes the circuit again or re-opens it.
+    Errors listed in `ignored_errors` (e.g. invalid input), and errors for which `is_failure`
+    returns False, pass through without counting.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        reset_timeout: float = 10.0,
+        latency_budget: Optional[float] = None,
+        ignored_errors: Tuple[Type[BaseException], ...] = (),
+        is_failure: Callable[[BaseException], bool] = lambda error: True,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if failure_threshold < 1:
+            raise ValueError("failure_threshold must be at least 1")
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.latency_budget = latency_budget
+        self.ignored_errors = ignored_errors
+        self.is_failure = is_failure
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = CircuitState.CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._total_failures = 0
+        self._total_rejections = 0
+
+    @property
+    def state(self) -> CircuitState:
+        with self._lock:
+            return self._current_state()
+
+    def call(self, func: Callable[[], T]) -> T:
+        """Run func through the breaker"""
+        self._before_call()
+        started = self._clock()
+        try:
+            result = func()
+        except self.ignored_errors:
+            self._record_success()
+            raise
+        except Exception as e:
+            if self.is_failure(e):
+                self._record_failure()
+            else:
+                self._record_success()
+            raise
+        elapsed = self._clock() - started
+        if self.latency_budget is not None and elapsed > self.latency_budget:
+            logger.warning(f"Circuit '{self.name}': call took {elapsed:.3f}s, over budget {self.latency_budget:.3f}s")
+            self._record_failure()
+        else:
+            self._record_success()
+        return result
+
+    def reset(self) -> None:
+        """Close the circuit and forget all failures"""
+        with self._lock:
+            self._state = CircuitState.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the breaker state for health and metrics endpoints"""
+        with self._lock:
+            return {
+                "name": self.name,
+                "state": self._current_state().value,
+                "consecutive_failures": self._consecutive_failures,
+                "total_failures": self._total_failures,
+                "total_rejections": self._total_rejections,
+            }
+
+    def _current_state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and self._clock() - self._opened_at >= self.reset_timeout:
+            return CircuitState.HALF_OPEN
+        return self._state
+
+    def _before_call(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            if state == CircuitState.CLOSED:
+                return
+            if state == CircuitState.HALF_OPEN and not self._probe_in_flight:
+                self._state = CircuitState.HALF_OPEN
+                self._probe_in_flight = True
+                return
+            self._total_rejections += 1
+        raise CircuitOpenError(f"Circuit '{self.name}' is open")
+
+    def _record_success(self) -> None:
+        with self._lock:
+            if self._state != CircuitState.CLOSED:
+                logger.info(f"Circuit '{self.name}' closed")
+            self._state = CircuitState.CLOSED
+            self._consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def _record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            self._total_failures += 1
+            if self._state == CircuitState.HALF_OPEN or self._consecutive_failures >= self.failure_threshold:
+                if self._state != CircuitState.OPEN:
+                    logger.warning(f"Circuit '{self.name}' opened after {self._consecutive_failures} failures")
+                self._state = CircuitState.OPEN
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+
+
+def is_availability_error(error: BaseException) -> bool:
+    """Check whether an error means the database is unreachable, overloaded or too slow, not that a request was bad"""
+    if isinstance(error, (OperationalError, PoolTimeoutError, ConnectionError, TimeoutError)):
+        return True
+    return isinstance(error, DBAPIError) and error.connection_invalidated
+
+
+# Data errors, constraint violations and bad SQL are the caller's problem and must not open the circuit for everyone
+DB_BREAKER = CircuitBreaker(
+    "database",
+    failure_threshold=int(os.environ.get("APP_DB_BREAKER_FAILURES", "5")),
+    reset_timeout=float(os.environ.get("APP_DB_BREAKER_RESET_SECONDS", "10")),
+    latency_budget=float(os.environ.get("APP_DB_LATENCY_BUDGET_MS", "500")) / 1000,
+    is_failure=is_availability_error,
+)
@@ -0,0 +1,96 @@
+import resource
+import sys
+from pathlib import Path
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+from typing import Any, Dict, List, Set
+from nicegui import app, Client
+from nicegui.element import Element
+import logging
+
+logger = logging.getLogger(__name__)
+
+STATM_PATH = Path("/proc/self/statm")
+
+
+def get_process_memory_bytes() -> int:
+    """Return the resident set size of the server process in bytes"""
+    try:
+        resident_pages = int(STATM_PATH.read_text().split()[1])
+        return resident_pages * resource.getpagesize()
+    except (OSError, IndexError, ValueError):
+        # Not on Linux: fall back to the peak RSS (reported in kilobytes on Linux, bytes on macOS)
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+# Objects reached from an element that it does not own: other elements, the client and shared code
+_NOT_OWNED = (Element, Client, type, ModuleType, FunctionType, MethodType, BuiltinFunctionType)
+
+
+def _owned_bytes(obj: Any, seen: Set[int]) -> int:
+    """Size of obj plus everything it references through containers and attributes, each object counted once"""
+    if id(obj) in seen or isinstance(obj, _NOT_OWNED):
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(_owned_bytes(key, seen) + _owned_bytes(value, seen) for key, value in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(_owned_bytes(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += _owned_bytes(vars(obj), seen)
+    return size
+
+
+def estimate_element_bytes(element: Element) -> int:
+    """Estimate the server-side memory owned by a single element.
+
+    Follows the element's attributes down through props, classes, styles, slots and event listeners,
+    but not into other elements, the client or handler code, which are shared or counted on their own.
+    Per-client state outside the elements (outbox, page and socket bookkeeping) is not included.
+    """
+    seen: Set[int] = set()
+    return sys.getsizeof(element) + _owned_bytes(vars(element), seen)
+
+
+class ClientMetrics:
+    """Collect memory and element statistics per connected NiceGUI client"""
+
+    @staticmethod
+    def get_client_stats(client: Client) -> Dict[str, Any]:
+        """Return element count and estimated memory for a single client.
+
+        The client id is left out on purpose: NiceGUI's socket handlers trust it alone,
+        so publishing it would let anyone attach to another visitor's page.
+        """
+        elements = list(client.elements.values())
+        return {
+            "path": client.page.path,
+            "connected": client.has_socket_connection,
+            "elements": len(elements),
+            "estimated_bytes": sum(estimate_element_bytes(element) for element in elements),
+        }
+
+    @staticmethod
+    def collect() -> Dict[str, Any]:
+        """Return process memory together with per-client element statistics"""
+        clients: List[Dict[str, Any]] = [
+            ClientMetrics.get_client_stats(client) for client in list(Client.instances.values()) if not client.shared
+        ]
+        total_elements = sum(stats["elements"] for stats in clients)
+        return {
+            "process_memory_bytes": get_process_memory_bytes(),
+            "client_count": len(clients),
+            "connected_client_count": sum(1 for stats in clients if stats["connected"]),
+            "total_elements": total_elements,
+            "average_elements_per_client": total_elements / len(clients) if clients else 0.0,
+            "clients": clients,
+        }
+
+
+def create():
+    """Register the client metrics endpoint"""
+
+    @app.get("/metrics/clients")
+    async def client_metrics():
+        return ClientMetrics.collect()
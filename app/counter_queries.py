@@ -0,0 +1,172 @@
+import os
+import re
+from typing import Any, Callable, Dict, List, Set, Union
+from sqlalchemy import (
+    Connection,
+    CursorResult,
+    DateTime,
+    Insert,
+    Integer,
+    Select,
+    Update,
+    bindparam,
+    cast,
+    exists,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
+    update,
+)
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql.psycopg2 import PGDialect_psycopg2
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import col
+from app.models import Counter, CounterOperation
+from app.retry import INVALID_STATEMENT_NAME
+import logging
+
+logger = logging.getLogger(__name__)
+
+PREPARED_STATEMENT_MODES = ("client", "server")
+# "client" reuses statements built once through SQLAlchemy's compiled cache, which is safe behind PgBouncer in
+# transaction mode; "server" also PREPAREs them once per Postgres connection, which needs connections pinned to
+# one server session (direct, or PgBouncer in session mode)
+PREPARED_STATEMENTS = os.environ.get("APP_PREPARED_STATEMENTS", "client")
+
+_PREPARED_KEY = "prepared_counter_queries"
+# Statement types a counter query can be built from
+CounterStatement = Union[Select[Any], Update, Insert]
+_BIND_PARAMETER = re.compile(r"%\((\w+)\)s")
+# Id of the row created when the counters table is empty; its primary key serialises concurrent creators
+COUNTER_ID = 1
+
+
+def set_prepared_statements(mode: str) -> None:
+    """Switch how counter queries are executed, e.g. to compare the modes in tests and benchmarks"""
+    global PREPARED_STATEMENTS
+    if mode not in PREPARED_STATEMENT_MODES:
+        raise ValueError(f"Unknown prepared statement mode '{mode}', expected one of {PREPARED_STATEMENT_MODES}")
+    PREPARED_STATEMENTS = mode
+
+
+class CounterQuery:
+    """A counter statement built once, executed according to the prepared statement mode"""
+
+    def __init__(self, name: str, build: Callable[[], CounterStatement]):
+        self.name = name
+        self.statement = build()
+        # Derive the PREPARE/EXECUTE pair from the statement itself so both modes always run the same SQL
+        sql = str(self.statement.compile(dialect=PGDialect_psycopg2()))
+        self.parameters: List[str] = list(dict.fromkeys(_BIND_PARAMETER.findall(sql)))
+        positions = {parameter: index + 1 for index, parameter in enumerate(self.parameters)}
+        self.prepare_sql = f"PREPARE {name} AS " + _BIND_PARAMETER.sub(lambda m: f"${positions[m.group(1)]}", sql)
+        arguments = ", ".join(f"%({parameter})s" for parameter in self.parameters)
+        self.execute_sql = f"EXECUTE {name}({arguments})" if arguments else f"EXECUTE {name}"
+
+    def execute(self, connection: Connection, **parameters: Any) -> CursorResult[Any]:
+        if PREPARED_STATEMENTS == "server" and connection.dialect.name == "postgresql":
+            return self._execute_prepared(connection, parameters)
+        return connection.execute(self.statement, parameters)
+
+    def _execute_prepared(self, connection: Connection, parameters: Dict[str, Any]) -> CursorResult[Any]:
+        # Connection.info lives as long as the DBAPI connection, so each server session prepares a query once
+        prepared: Set[str] = connection.info.setdefault(_PREPARED_KEY, set())
+        if self.name not in prepared:
+            connection.exec_driver_sql(self.prepare_sql)
+            prepared.add(self.name)
+        try:
+            return connection.exec_driver_sql(self.execute_sql, parameters)
+        except DBAPIError as e:
+            if getattr(e.orig, "pgcode", None) == INVALID_STATEMENT_NAME:
+                logger.warning(f"Prepared statement {self.name} vanished from the server session, will prepare again")
+                prepared.clear()
+            raise
+
+
+def _first_counter_id() -> Any:
+    return select(func.min(col(Counter.id))).scalar_subquery()
+
+
+def _new_value_within_bounds() -> List[Any]:
+    # Only the bound in the direction of delta applies, so a value already out of range can move back towards it
+    delta = bindparam("delta", type_=Integer)
+    new_value = col(Counter.value) + delta
+    # A literal 0 rather than a bind parameter lets PREPARE infer delta as an integer
+    zero = literal_column("0")
+    return [
+        or_(delta >= zero, new_value >= func.coalesce(bindparam("min_value", type_=Integer), new_value)),
+        or_(delta <= zero, new_value <= func.coalesce(bindparam("max_value", type_=Integer), new_value)),
+    ]
+
+
+READ_VALUE = CounterQuery(
+    "counter_read_value", lambda: select(col(Counter.value)).where(col(Counter.id) == _first_counter_id())
+)
+
+LOOKUP_OPERATION = CounterQuery(
+    "counter_lookup_operation",
+    lambda: select(col(CounterOperation.operation), col(CounterOperation.result_value)).where(
+        col(CounterOperation.idempotency_key) == bindparam("key")
+    ),
+)
+
+# value * keep + offset covers increment (1, 1), decrement (1, -1) and reset to n (0, n)
+APPLY = CounterQuery(
+    "counter_apply",
+    lambda: (
+        update(Counter)
+        .where(col(Counter.id) == _first_counter_id())
+        .values(value=col(Counter.value) * bindparam("keep") + bindparam("offset"), updated_at=bindparam("now"))
+        .returning(col(Counter.value))
+    ),
+)
+
+ADD_WITHIN_BOUNDS = CounterQuery(
+    "counter_add_within_bounds",
+    lambda: (
+        update(Counter)
+        .where(col(Counter.id) == _first_counter_id(), *_new_value_within_bounds())
+        .values(value=col(Counter.value) + bindparam("delta", type_=Integer), updated_at=bindparam("now"))
+        .returning(col(Counter.value))
+    ),
+)
+
+COMPARE_AND_SET = CounterQuery(
+    "counter_compare_and_set",
+    lambda: (
+        update(Counter)
+        .where(col(Counter.id) == _first_counter_id(), col(Counter.value) == bindparam("expected"))
+        .values(value=bindparam("new"), updated_at=bindparam("now"))
+        .returning(col(Counter.value))
+    ),
+)
+
+# Create the counter at 0 unless a row exists; concurrent callers wait on COUNTER_ID and then do nothing
+ENSURE_COUNTER = CounterQuery(
+    "counter_ensure",
+    lambda: (
+        postgresql.insert(Counter)
+        .from_select(
+            ["id", "value", "created_at", "updated_at"],
+            select(
+                literal_column(str(COUNTER_ID)),
+                literal_column("0"),
+                cast(bindparam("now"), DateTime),
+                cast(bindparam("now"), DateTime),
+            ).where(~exists().select_from(Counter)),
+        )
+        .on_conflict_do_nothing(index_elements=["id"])
+    ),
+)
+
+RECORD_OPERATION = CounterQuery(
+    "counter_record_operation",
+    lambda: insert(CounterOperation).values(
+        idempotency_key=bindparam("key"),
+        operation=bindparam("op"),
+        result_value=bindparam("result"),
+        created_at=bindparam("now"),
+    ),
+)
@@ -1,71 +1,282 @@
-from sqlmodel import Session, select
+import asyncio
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+from uuid import uuid4
+from nicegui import app
+from sqlalchemy import Engine
+from sqlmodel import Session, col, select, delete
+from app import counter_queries
+from app.admission import WRITE_ADMISSION
+from app.counter_queries import CounterQuery
 from app.database import ENGINE
-from app.models import Counter
-from datetime import datetime
+from app.circuit_breaker import DB_BREAKER, CircuitOpenError
+from app.models import Counter, CounterOperation, CounterReading, CounterUpdateResult
+from app.rate_tracker import RATE_TRACKER
+from app.read_routing import READ_ROUTER
+from app.retry import retry_with_backoff
+from app.tracing import traced
+from datetime import datetime, timedelta
 import logging
 
 logger = logging.getLogger(__name__)
 
+# How long applied operations are remembered, i.e. the window in which a retried key is recognised
+IDEMPOTENCY_RETENTION = timedelta(seconds=float(os.environ.get("APP_IDEMPOTENCY_RETENTION_SECONDS", "86400")))
+# Time between two purges of expired idempotency keys
+IDEMPOTENCY_PRUNE_INTERVAL = 60.0
+# Each purge deletes in short transactions of this many keys
+IDEMPOTENCY_PRUNE_BATCH = int(os.environ.get("APP_IDEMPOTENCY_PRUNE_BATCH", "1000"))
+# A purge keeps deleting full batches for up to this long; the timer waits for a run to finish, so a purge that
+# uses the whole budget is followed by the next one at once and keeps pace with any sustained write rate
+IDEMPOTENCY_PRUNE_TIME_BUDGET = IDEMPOTENCY_PRUNE_INTERVAL
+# Name of the counter in the rate tracker
+RATE_COUNTER = "counter"
+MAX_IDEMPOTENCY_KEY_LENGTH = 64
+
+
+def _check_idempotency_key(idempotency_key: str) -> None:
+    if not idempotency_key or len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise ValueError(f"idempotency_key must be between 1 and {MAX_IDEMPOTENCY_KEY_LENGTH} characters")
+
 
 class CounterService:
     """Service class to handle counter operations"""
 
+    _prune_lock = threading.Lock()
+    # Last value read from or written to the database, served while the circuit is open
+    _last_known_value: Optional[int] = None
+
     @staticmethod
+    @traced("counter_service.get_or_create_counter")
     def get_or_create_counter() -> Counter:
         """Get the current counter or create a new one if none exists"""
-        with Session(ENGINE) as session:
-            counter = session.exec(select(Counter)).first()
-            if counter is None:
-                counter = Counter(value=0)
-                session.add(counter)
-                session.commit()
-                session.refresh(counter)
-            return counter
+        counter = DB_BREAKER.call(CounterService._get_or_create_counter)
+        CounterService._last_known_value = counter.value
+        return counter
 
     @staticmethod
-    def increment_counter() -> int:
+    @traced("counter_service.increment_counter")
+    def increment_counter(idempotency_key: Optional[str] = None, session_key: Optional[str] = None) -> int:
         """Increment the counter by 1 and return new value"""
-        with Session(ENGINE) as session:
-            counter = session.exec(select(Counter)).first()
-            if counter is None:
-                counter = Counter(value=1)
-                session.add(counter)
-            else:
-                counter.value += 1
-                counter.updated_at = datetime.utcnow()
-            session.commit()
-            return counter.value
+        return CounterService._run_operation("increment", 1, 1, idempotency_key, session_key)
 
     @staticmethod
-    def decrement_counter() -> int:
+    @traced("counter_service.decrement_counter")
+    def decrement_counter(idempotency_key: Optional[str] = None, session_key: Optional[str] = None) -> int:
         """Decrement the counter by 1 and return new value"""
-        with Session(ENGINE) as session:
-            counter = session.exec(select(Counter)).first()
-            if counter is None:
-                counter = Counter(value=-1)
-                session.add(counter)
-            else:
-                counter.value -= 1
-                counter.updated_at = datetime.utcnow()
-            session.commit()
-            return counter.value
+        return CounterService._run_operation("decrement", 1, -1, idempotency_key, session_key)
+
+    @staticmethod
+    @traced("counter_service.reset_counter")
+    def reset_counter(idempotency_key: Optional[str] = None, session_key: Optional[str] = None, value: int = 0) -> int:
+        """Reset the counter to value (0 by default) and return new value"""
+        return CounterService._run_operation("reset", 0, value, idempotency_key, session_key)
+
+    @staticmethod
+    @traced("counter_service.compare_and_set")
+    def compare_and_set(
+        expected: int, new: int, idempotency_key: Optional[str] = None, session_key: Optional[str] = None
+    ) -> CounterUpdateResult:
+        """Set the counter to new only if it still holds expected, in a single conditional UPDATE"""
+        return CounterService._run_conditional(
+            "compare_and_set",
+            counter_queries.COMPARE_AND_SET,
+            {"expected": expected, "new": new},
+            idempotency_key,
+            session_key,
+        )
+
+    @staticmethod
+    @traced("counter_service.add")
+    def add(
+        delta: int,
+        min_value: Optional[int] = None,
+        max_value: Optional[int] = None,
+        idempotency_key: Optional[str] = None,
+        session_key: Optional[str] = None,
+    ) -> CounterUpdateResult:
+        """Add delta only if the result does not pass the bound it moves towards, in a single conditional UPDATE.
+
+        An increment is checked against max_value and a decrement against min_value, so a value that is
+        already out of range (set by reset or compare_and_set) can still move back towards the range.
+        """
+        if min_value is not None and max_value is not None and min_value > max_value:
+            raise ValueError(f"min_value {min_value} is greater than max_value {max_value}")
+        return CounterService._run_conditional(
+            "add",
+            counter_queries.ADD_WITHIN_BOUNDS,
+            {"delta": delta, "min_value": min_value, "max_value": max_value},
+            idempotency_key,
+            session_key,
+        )
+
+    @staticmethod
+    @traced("counter_service.get_current_value")
+    def get_current_value(session_key: Optional[str] = None) -> int:
+        """Get the current counter value, reading from a replica unless the session just wrote.
+
+        Replica reads have their own breakers; only a read that reaches the primary goes through DB_BREAKER.
+        """
+        value = READ_ROUTER.run_read(CounterService._read_value, session_key)
+        if value is None:
+            return CounterService.get_or_create_counter().value
+        CounterService._last_known_value = value
+        return value
 
     @staticmethod
-    def reset_counter() -> int:
-        """Reset the counter to 0 and return new value"""
+    @traced("counter_service.get_reading")
+    def get_reading(session_key: Optional[str] = None) -> CounterReading:
+        """Get the current value, falling back to the last known value if the database is unavailable"""
+        try:
+            return CounterReading(value=CounterService.get_current_value(session_key))
+        except Exception as e:
+            if not isinstance(e, CircuitOpenError):
+                logger.error(f"Error reading counter: {str(e)}")
+            return CounterReading(value=CounterService._last_known_value, stale=True)
+
+    @staticmethod
+    def get_rates() -> Dict[str, float]:
+        """Get the applied operations per second over the 1s/1m/15m windows; 1m and 15m cover all processes"""
+        return RATE_TRACKER.rates(RATE_COUNTER)
+
+    @staticmethod
+    @traced("counter_service.prune_idempotency_keys")
+    def prune_idempotency_keys(
+        now: Optional[datetime] = None,
+        batch_size: int = IDEMPOTENCY_PRUNE_BATCH,
+        time_budget: float = IDEMPOTENCY_PRUNE_TIME_BUDGET,
+    ) -> int:
+        """Delete recorded operations older than the retention window and return how many were removed.
+
+        Deletes in batches so that no single statement runs into the statement timeout, and keeps going
+        while batches come back full until time_budget seconds have passed; at least one batch always
+        runs, and whatever is left is removed by the next run. Returns 0 at once if a purge is already
+        running in this process.
+        """
+        if not CounterService._prune_lock.acquire(blocking=False):
+            return 0
+        try:
+            deadline = time.monotonic() + time_budget
+            cutoff = (now or datetime.utcnow()) - IDEMPOTENCY_RETENTION
+            expired = (
+                select(CounterOperation.idempotency_key)
+                .where(CounterOperation.created_at < cutoff)
+                .limit(batch_size)
+                .scalar_subquery()
+            )
+            statement = delete(CounterOperation).where(col(CounterOperation.idempotency_key).in_(expired))
+            removed = 0
+            while True:
+                with Session(ENGINE) as session:
+                    deleted = session.exec(statement).rowcount  # type: ignore[call-overload]
+                    session.commit()
+                removed += deleted
+                if deleted < batch_size:
+                    return removed
+                if time.monotonic() >= deadline:
+                    logger.info(f"Idempotency key purge used its {time_budget:.0f}s budget, continuing next run")
+                    return removed
+        finally:
+            CounterService._prune_lock.release()
+
+    @staticmethod
+    def _run_operation(
+        operation: str, keep: int, offset: int, idempotency_key: Optional[str], session_key: Optional[str]
+    ) -> int:
+        """Set the counter to value * keep + offset under an idempotency key"""
+        parameters = {"keep": keep, "offset": offset}
+        return CounterService._run_conditional(
+            operation, counter_queries.APPLY, parameters, idempotency_key, session_key
+        ).value
+
+    @staticmethod
+    def _run_conditional(
+        operation: str,
+        query: CounterQuery,
+        parameters: Dict[str, Any],
+        idempotency_key: Optional[str],
+        session_key: Optional[str],
+    ) -> CounterUpdateResult:
+        """Apply a conditional update under an idempotency key, retrying on transient database errors"""
+        key = uuid4().hex if idempotency_key is None else idempotency_key
+        _check_idempotency_key(key)
+        # Admission comes first so that rejected writes never wait for a connection or count as database failures
+        result = WRITE_ADMISSION.call(
+            lambda: DB_BREAKER.call(
+                lambda: retry_with_backoff(lambda: CounterService._apply_once(operation, query, parameters, key))
+            )
+        )
+        CounterService._last_known_value = result.value
+        if result.applied:
+            # A replay was counted when it first applied; its session is still marked in case that attempt failed
+            if not result.replayed:
+                RATE_TRACKER.record(RATE_COUNTER)
+            READ_ROUTER.mark_write(session_key)
+        return result
+
+    @staticmethod
+    def _read_value(engine: Engine) -> Optional[int]:
+        """Read the counter value from the given engine without creating it"""
+        with engine.connect() as connection:
+            return counter_queries.READ_VALUE.execute(connection).scalar()
+
+    @staticmethod
+    def _get_or_create_counter() -> Counter:
         with Session(ENGINE) as session:
-            counter = session.exec(select(Counter)).first()
+            counter = session.exec(select(Counter).order_by(col(Counter.id))).first()
             if counter is None:
-                counter = Counter(value=0)
-                session.add(counter)
-            else:
-                counter.value = 0
-                counter.updated_at = datetime.utcnow()
-            session.commit()
-            return counter.value
+                counter_queries.ENSURE_COUNTER.execute(session.connection(), now=datetime.utcnow())
+                session.commit()
+                counter = session.exec(select(Counter).order_by(col(Counter.id))).one()
+            return counter
 
     @staticmethod
-    def get_current_value() -> int:
-        """Get the current counter value"""
-        counter = CounterService.get_or_create_counter()
-        return counter.value
+    def _apply_once(
+        operation: str,
+        query: CounterQuery,
+        parameters: Dict[str, Any],
+        idempotency_key: str,
+    ) -> CounterUpdateResult:
+        """Run one conditional UPDATE and record its key if it applied.
+
+        A missing counter counts as 0: it is created at 0 and the UPDATE runs again, so concurrent writers
+        on an empty table all update the same row.
+        """
+        with ENGINE.begin() as connection:
+            recorded = counter_queries.LOOKUP_OPERATION.execute(connection, key=idempotency_key).first()
+            if recorded is not None:
+                if recorded.operation != operation:
+                    raise ValueError(
+                        f"Idempotency key {idempotency_key} was already used for operation '{recorded.operation}'"
+                    )
+                return CounterUpdateResult(applied=True, value=recorded.result_value, replayed=True)
+
+            now = datetime.utcnow()
+            value = query.execute(connection, now=now, **parameters).scalar()
+            if value is None:
+                # The counter may be missing, or created by a writer that committed after this UPDATE started
+                counter_queries.ENSURE_COUNTER.execute(connection, now=now)
+                value = query.execute(connection, now=now, **parameters).scalar()
+            if value is None:
+                current = counter_queries.READ_VALUE.execute(connection).scalar()
+                return CounterUpdateResult(applied=False, value=0 if current is None else current)
+            counter_queries.RECORD_OPERATION.execute(
+                connection, key=idempotency_key, op=operation, result=value, now=now
+            )
+            return CounterUpdateResult(applied=True, value=value)
+
+
+def create():
+    """Register the periodic purge of expired idempotency keys, off the request path"""
+
+    async def prune():
+        try:
+            removed = await asyncio.to_thread(CounterService.prune_idempotency_keys)
+            if removed:
+                logger.info(f"Pruned {removed} expired idempotency keys")
+        except Exception as e:
+            logger.warning(f"Error pruning idempotency keys: {str(e)}")
+
+    app.timer(IDEMPOTENCY_PRUNE_INTERVAL, prune, immediate=False)
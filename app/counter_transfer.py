@@ -0,0 +1,226 @@
+"""Bulk export and import of counter tables.
+
+Usage:
+    python -m app.counter_transfer export counters counters.csv
+    python -m app.counter_transfer import counter_operations ops.bin --format binary
+    python -m app.counter_transfer export counters - | gzip > counters.csv.gz
+
+On Postgres the data is streamed with COPY; other backends fall back to batched SELECT/INSERT (CSV only).
+Memory use is bounded by the batch size in both cases.
+"""
+
+import argparse
+import contextlib
+import csv
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Any, ContextManager, Dict, Iterator, List, Optional
+from sqlalchemy import DateTime, Engine, Integer, Table, func, select
+from sqlmodel import SQLModel
+from app.database import ENGINE
+from app.models import Counter, CounterOperation
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = int(os.environ.get("APP_TRANSFER_BATCH_SIZE", "10000"))
+# Bulk COPY runs far longer than the app's statement_timeout; 0 disables the timeout for the transfer
+TRANSFER_STATEMENT_TIMEOUT_MS = int(os.environ.get("APP_TRANSFER_STATEMENT_TIMEOUT_MS", "0"))
+FORMATS = ("csv", "binary")
+
+# Tables that can be transferred, in dependency order
+TRANSFER_TABLES: Dict[str, Table] = {
+    Counter.__tablename__: Counter.__table__,  # type: ignore[dict-item]
+    CounterOperation.__tablename__: CounterOperation.__table__,  # type: ignore[dict-item]
+}
+
+
+def get_transfer_table(name: str) -> Table:
+    table = TRANSFER_TABLES.get(name)
+    if table is None:
+        raise ValueError(f"Unknown table '{name}', expected one of: {', '.join(TRANSFER_TABLES)}")
+    return table
+
+
+def _check_format(fmt: str, engine: Engine) -> None:
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}', expected one of: {', '.join(FORMATS)}")
+    if fmt == "binary" and engine.dialect.name != "postgresql":
+        raise ValueError("Binary format requires Postgres COPY")
+
+
+def _copy_options(fmt: str) -> str:
+    return "FORMAT csv, HEADER" if fmt == "csv" else "FORMAT binary"
+
+
+def export_table(
+    name: str, out: IO[Any], fmt: str = "csv", batch_size: int = DEFAULT_BATCH_SIZE, engine: Engine = ENGINE
+) -> int:
+    """Stream all rows of a table to a file object (text for csv, binary for binary) and return the row count"""
+    table = get_transfer_table(name)
+    _check_format(fmt, engine)
+    if engine.dialect.name == "postgresql":
+        return _copy_out(table, out, fmt, engine)
+    return _batched_export(table, out, batch_size, engine)
+
+
+def import_table(
+    name: str,
+    source: IO[Any],
+    fmt: str = "csv",
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    engine: Engine = ENGINE,
+    truncate: bool = False,
+) -> int:
+    """Load rows from a file object produced by export_table into a table and return the row count.
+
+    With truncate, the table is emptied in the same transaction as the load, so a failed import leaves
+    the existing rows in place.
+    """
+    table = get_transfer_table(name)
+    _check_format(fmt, engine)
+    if engine.dialect.name == "postgresql":
+        return _copy_in(table, source, fmt, batch_size, engine, truncate)
+    return _batched_import(table, source, batch_size, engine, truncate)
+
+
+def _copy_out(table: Table, out: IO[Any], fmt: str, engine: Engine) -> int:
+    columns = ", ".join(column.name for column in table.columns)
+    connection = engine.raw_connection()
+    try:
+        with contextlib.closing(connection.cursor()) as cursor:
+            _set_transfer_timeout(cursor)
+            cursor.copy_expert(f"COPY {table.name} ({columns}) TO STDOUT WITH ({_copy_options(fmt)})", out)
+            return cursor.rowcount
+    finally:
+        connection.close()
+
+
+def _copy_in(table: Table, source: IO[Any], fmt: str, batch_size: int, engine: Engine, truncate: bool) -> int:
+    columns = ", ".join(column.name for column in table.columns)
+    connection = engine.raw_connection()
+    try:
+        with contextlib.closing(connection.cursor()) as cursor:
+            _set_transfer_timeout(cursor)
+            if truncate:
+                cursor.execute(f"TRUNCATE {table.name}")
+            # COPY reads the file in chunks of `size` bytes; scale the buffer with the batch size
+            cursor.copy_expert(
+                f"COPY {table.name} ({columns}) FROM STDIN WITH ({_copy_options(fmt)})", source, size=batch_size * 64
+            )
+            row_count = cursor.rowcount
+            _sync_id_sequence(cursor, table)
+        connection.commit()
+        return row_count
+    except Exception as e:
+        logger.error(f"Error importing into {table.name}: {str(e)}")
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def _set_transfer_timeout(cursor: Any) -> None:
+    # SET LOCAL only lasts until the transaction ends, so the pooled connection keeps its own timeout
+    cursor.execute(f"SET LOCAL statement_timeout = {TRANSFER_STATEMENT_TIMEOUT_MS}")
+
+
+def _sync_id_sequence(cursor: Any, table: Table) -> None:
+    """Move a serial id sequence past imported ids so later inserts do not collide"""
+    if "id" not in table.columns or not table.columns["id"].autoincrement:
+        return
+    sequence = f"pg_get_serial_sequence('{table.name}', 'id')"
+    cursor.execute(f"SELECT setval({sequence}, COALESCE(MAX(id), 0) + 1, false) FROM {table.name}")
+
+
+def _batched_export(table: Table, out: IO[str], batch_size: int, engine: Engine) -> int:
+    writer = csv.writer(out)
+    writer.writerow([column.name for column in table.columns])
+    row_count = 0
+    with engine.connect() as connection:
+        result = connection.execution_options(yield_per=batch_size).execute(select(table))
+        for partition in result.partitions():
+            writer.writerows(partition)
+            row_count += len(partition)
+    return row_count
+
+
+def _parse_csv_rows(table: Table, source: IO[str]) -> Iterator[Dict[str, Any]]:
+    reader = csv.DictReader(source)
+    for record in reader:
+        row: Dict[str, Any] = {}
+        for column in table.columns:
+            raw = record.get(column.name)
+            if raw is None or raw == "":
+                row[column.name] = None
+            elif isinstance(column.type, Integer):
+                row[column.name] = int(raw)
+            elif isinstance(column.type, DateTime):
+                row[column.name] = datetime.fromisoformat(raw)
+            else:
+                row[column.name] = raw
+        yield row
+
+
+def _batched_import(table: Table, source: IO[str], batch_size: int, engine: Engine, truncate: bool) -> int:
+    row_count = 0
+    batch: List[Dict[str, Any]] = []
+    with engine.begin() as connection:
+        if truncate:
+            connection.execute(table.delete())
+        for row in _parse_csv_rows(table, source):
+            batch.append(row)
+            if len(batch) >= batch_size:
+                connection.execute(table.insert(), batch)
+                row_count += len(batch)
+                batch = []
+        if batch:
+            connection.execute(table.insert(), batch)
+            row_count += len(batch)
+    return row_count
+
+
+def count_rows(name: str, engine: Engine = ENGINE) -> int:
+    table = get_transfer_table(name)
+    with engine.connect() as connection:
+        return connection.execute(select(func.count()).select_from(table)).scalar_one()
+
+
+def _open(path: str, fmt: str, mode: str) -> ContextManager[IO[Any]]:
+    if path == "-":
+        stream = sys.stdout if mode == "w" else sys.stdin
+        # Leave stdio open when done
+        return contextlib.nullcontext(stream.buffer if fmt == "binary" else stream)
+    if fmt == "binary":
+        return Path(path).open(mode + "b")
+    return Path(path).open(mode, newline="", encoding="utf-8")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk export and import of counter tables")
+    parser.add_argument("command", choices=("export", "import"))
+    parser.add_argument("table", choices=list(TRANSFER_TABLES))
+    parser.add_argument("path", help="file to write or read, '-' for stdout/stdin")
+    parser.add_argument("--format", choices=FORMATS, default="csv")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--truncate", action="store_true", help="empty the table in the same transaction as the import")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+    SQLModel.metadata.create_all(ENGINE)
+
+    if args.command == "export":
+        with _open(args.path, args.format, "w") as out:
+            row_count = export_table(args.table, out, args.format, args.batch_size)
+        logger.info(f"Exported {row_count} rows from {args.table}")
+    else:
+        with _open(args.path, args.format, "r") as source:
+            row_count = import_table(args.table, source, args.format, args.batch_size, truncate=args.truncate)
+        logger.info(f"Imported {row_count} rows into {args.table}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,102 +1,295 @@
-from nicegui import ui
+import asyncio
+import os
+from typing import Any, Dict, Literal, Optional
+from uuid import uuid4
+from nicegui import app, binding, ui
+from app.admission import WRITE_ADMISSION, AdmissionRejectedError
 from app.counter_service import CounterService
+from app.tracing import span
 import logging
 
 logger = logging.getLogger(__name__)
 
+# How long a disconnected tab keeps its element tree before the client is deleted
+RECONNECT_TIMEOUT = float(os.environ.get("APP_RECONNECT_TIMEOUT", "2.0"))
+
 
 class TextStyles:
     """Consistent text styles for the application"""
 
-    HEADING = "text-4xl font-bold text-gray-800 mb-2"
-    SUBHEADING = "text-lg text-gray-600 mb-8"
-    COUNTER_DISPLAY = "text-8xl font-bold text-blue-600 mb-8 font-mono"
+    HEADING = "counter-heading"
+    SUBHEADING = "counter-subheading"
+    COUNTER_DISPLAY = "counter-display"
+    STATUS = "counter-status"
+    STATUS_BUSY = "counter-status-busy"
+    BOUNDS = "counter-bounds"
+    RATES = "counter-rates"
+
+
+class ButtonStyles:
+    """Consistent button styles for the application"""
+
+    DECREMENT = "counter-btn counter-btn-round counter-btn-decrement"
+    INCREMENT = "counter-btn counter-btn-round counter-btn-increment"
+    RESET = "counter-btn counter-btn-reset"
+
+
+# Shared stylesheet sent once in the page head instead of long Tailwind class lists on every element
+COUNTER_CSS = """
+body {
+    --q-primary: #2563eb;
+    --q-secondary: #64748b;
+    --q-accent: #10b981;
+    --q-positive: #10b981;
+    --q-negative: #ef4444;
+    --q-warning: #f59e0b;
+    --q-info: #3b82f6;
+}
+.counter-page {
+    width: 100%; min-height: 100vh; padding: 2rem;
+    align-items: center; justify-content: center;
+    background-image: linear-gradient(to bottom right, #eff6ff, #e0e7ff);
+}
+.counter-card {
+    padding: 3rem; max-width: 28rem; width: 100%; text-align: center; align-items: center;
+    background-color: rgb(255 255 255 / 0.8); backdrop-filter: blur(4px);
+    border: 1px solid rgb(255 255 255 / 0.3); border-radius: 1.5rem;
+    box-shadow: 0 25px 50px -12px rgb(0 0 0 / 0.25);
+}
+.counter-heading { font-size: 2.25rem; line-height: 2.5rem; font-weight: 700; color: #1f2937; margin-bottom: 0.5rem; }
+.counter-subheading { font-size: 1.125rem; line-height: 1.75rem; color: #4b5563; margin-bottom: 2rem; }
+.counter-display {
+    font-size: 6rem; line-height: 1; font-weight: 700; color: #2563eb; margin-bottom: 2rem;
+    font-family: ui-monospace, SFMono-Regular, Menlo, Monaco, Consolas, monospace;
+}
+.counter-status { font-size: 0.875rem; color: #b45309; margin-top: -1.5rem; margin-bottom: 1rem; }
+.counter-status-busy { color: #b91c1c; }
+.counter-bounds { font-size: 0.875rem; color: #6b7280; margin-top: -1.5rem; margin-bottom: 1rem; }
+.counter-rates { font-size: 0.875rem; color: #6b7280; margin-top: -1rem; margin-bottom: 1.5rem; }
+.counter-buttons { gap: 1rem; justify-content: center; margin-bottom: 1.5rem; }
+.counter-btn {
+    color: white !important; border-radius: 9999px; font-weight: 600;
+    box-shadow: 0 10px 15px -3px rgb(0 0 0 / 0.1); transition: all 200ms;
+}
+.counter-btn:hover { box-shadow: 0 20px 25px -5px rgb(0 0 0 / 0.1); }
+.counter-btn-round { width: 3.5rem; height: 3.5rem; font-size: 1.5rem; font-weight: 700; }
+.counter-btn-decrement { background-color: #ef4444 !important; }
+.counter-btn-decrement:hover { background-color: #dc2626 !important; }
+.counter-btn-increment { background-color: #22c55e !important; }
+.counter-btn-increment:hover { background-color: #16a34a !important; }
+.counter-btn-reset { padding: 0.75rem 2rem; background-color: #6b7280 !important; }
+.counter-btn-reset:hover { background-color: #4b5563 !important; }
+"""
+
+_theme_applied = False
 
 
 def apply_modern_theme():
-    """Apply a modern color scheme"""
-    ui.colors(
-        primary="#2563eb",  # Professional blue
-        secondary="#64748b",  # Subtle gray
-        accent="#10b981",  # Success green
-        positive="#10b981",
-        negative="#ef4444",  # Error red
-        warning="#f59e0b",  # Warning amber
-        info="#3b82f6",  # Info blue
+    """Apply a modern color scheme and the counter styles to all pages"""
+    global _theme_applied
+    if _theme_applied:
+        return
+    ui.add_css(COUNTER_CSS, shared=True)
+    _theme_applied = True
+
+
+def _optional_int(raw: Optional[str]) -> Optional[int]:
+    return int(raw) if raw not in (None, "") else None
+
+
+# How often the activity rates shown on counter pages are refreshed
+RATES_REFRESH_INTERVAL = 1.0
+
+STALE_MESSAGE = "Database unavailable, showing last known value"
+BUSY_MESSAGE = "Server is busy, please try again"
+
+
+# Optional bounds for the counter page; the +/- buttons stop at these values
+COUNTER_MIN = _optional_int(os.environ.get("APP_COUNTER_MIN"))
+COUNTER_MAX = _optional_int(os.environ.get("APP_COUNTER_MAX"))
+
+
+def format_bounds(min_value: Optional[int], max_value: Optional[int]) -> str:
+    lower = "−∞" if min_value is None else str(min_value)
+    upper = "∞" if max_value is None else str(max_value)
+    return f"Range: {lower} to {upper}"
+
+
+def format_rates(rates: Dict[str, float]) -> str:
+    # The 1s window counts this server only, the longer ones every server
+    return f"{rates['1s']:.0f}/s here · {rates['1m'] * 60:.0f}/min · {rates['15m'] * 60:.1f}/min over 15 min"
+
+
+class RatesDisplay:
+    """Rates text shared by every open counter page and refreshed by a single app-wide timer"""
+
+    text = binding.BindableProperty()
+
+    def __init__(self):
+        self.text = ""
+
+    def refresh(self):
+        self.text = format_rates(CounterService.get_rates())
+
+
+RATES_DISPLAY = RatesDisplay()
+
+
+class CounterPage:
+    """The elements and click handlers of one open counter page.
+
+    Handlers are bound methods of this slotted object rather than closures defined per page,
+    so each client holds one small object instead of a function, closure and cells per handler.
+    """
+
+    __slots__ = (
+        "min_value",
+        "max_value",
+        "reset_target",
+        "session_key",
+        "counter_display",
+        "status_label",
+        "decrement_button",
+        "increment_button",
     )
 
+    def __init__(self, min_value: Optional[int], max_value: Optional[int], reset_target: int, session_key: Any):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.reset_target = reset_target
+        # Reads after this browser's own writes are served from the primary
+        self.session_key = session_key
 
-def create():
-    """Create the counter application UI"""
+        # Page setup with centered layout on the page's own content element, so no wrapper element is needed
+        ui.context.client.content.classes("counter-page")
+        # Main card container
+        with ui.card().classes("counter-card"):
+            # Title and subtitle never change, so they go out as a single element
+            ui.html(
+                f'<div class="{TextStyles.HEADING}">Counter App</div>'
+                f'<div class="{TextStyles.SUBHEADING}">A simple, elegant counter</div>'
+            )
 
-    @ui.page("/")
-    def counter_page():
-        apply_modern_theme()
-        # Page setup with centered layout
-        with ui.column().classes("w-full min-h-screen bg-gradient-to-br from-blue-50 to-indigo-100"):
-            with ui.column().classes("flex-1 items-center justify-center p-8"):
-                # Main card container
-                with ui.card().classes(
-                    "p-12 bg-white/80 backdrop-blur-sm shadow-2xl rounded-3xl border border-white/30 max-w-md w-full text-center"
-                ):
-                    # Title
-                    ui.label("Counter App").classes(TextStyles.HEADING)
-                    ui.label("A simple, elegant counter").classes(TextStyles.SUBHEADING)
-
-                    # Counter display
-                    counter_display = ui.label().classes(TextStyles.COUNTER_DISPLAY).mark("counter-display")
-
-                    # Control buttons with modern styling
-                    with ui.row().classes("gap-4 justify-center mb-6"):
-                        # Decrement button
-                        ui.button("-", on_click=lambda: handle_decrement()).classes(
-                            "w-14 h-14 text-2xl font-bold bg-red-500 hover:bg-red-600 text-white rounded-full shadow-lg hover:shadow-xl transition-all duration-200"
-                        ).mark("decrement-button")
-
-                        # Increment button
-                        ui.button("+", on_click=lambda: handle_increment()).classes(
-                            "w-14 h-14 text-2xl font-bold bg-green-500 hover:bg-green-600 text-white rounded-full shadow-lg hover:shadow-xl transition-all duration-200"
-                        ).mark("increment-button")
-
-                    # Reset button
-                    ui.button("Reset", on_click=lambda: handle_reset()).classes(
-                        "px-8 py-3 bg-gray-500 hover:bg-gray-600 text-white rounded-full shadow-lg hover:shadow-xl transition-all duration-200 font-semibold"
-                    ).mark("reset-button")
-
-        def update_counter_display():
-            """Update the counter display with current value"""
-            current_value = CounterService.get_current_value()
-            counter_display.set_text(str(current_value))
-
-        def handle_increment():
-            """Handle increment button click"""
-            try:
-                new_value = CounterService.increment_counter()
-                counter_display.set_text(str(new_value))
-                ui.notify(f"Counter incremented to {new_value}", type="positive", position="top")
-            except Exception as e:
-                logger.error(f"Error incrementing counter: {str(e)}")
-                ui.notify(f"Error incrementing counter: {str(e)}", type="negative")
+            # Counter display
+            self.counter_display = ui.label().classes(TextStyles.COUNTER_DISPLAY).mark("counter-display")
+            # One label for whichever notice applies: stale value or busy server
+            self.status_label = ui.label().classes(TextStyles.STATUS).mark("counter-status")
+            self.status_label.set_visibility(False)
+            if min_value is not None or max_value is not None:
+                ui.label(format_bounds(min_value, max_value)).classes(TextStyles.BOUNDS).mark("counter-bounds")
+            ui.label().classes(TextStyles.RATES).mark("counter-rates").bind_text_from(RATES_DISPLAY, "text")
 
-        def handle_decrement():
-            """Handle decrement button click"""
-            try:
-                new_value = CounterService.decrement_counter()
-                counter_display.set_text(str(new_value))
-                ui.notify(f"Counter decremented to {new_value}", type="info", position="top")
-            except Exception as e:
-                logger.error(f"Error decrementing counter: {str(e)}")
-                ui.notify(f"Error decrementing counter: {str(e)}", type="negative")
+            # Control buttons
+            with ui.row().classes("counter-buttons"):
+                self.decrement_button = ui.button("-", on_click=self.handle_decrement)
+                self.decrement_button.classes(ButtonStyles.DECREMENT).mark("decrement-button")
+                self.increment_button = ui.button("+", on_click=self.handle_increment)
+                self.increment_button.classes(ButtonStyles.INCREMENT).mark("increment-button")
 
-        def handle_reset():
-            """Handle reset button click"""
+            # Reset button
+            ui.button("Reset", on_click=self.handle_reset).classes(ButtonStyles.RESET).mark("reset-button")
+
+    def show_status(self, message: Optional[str], busy: bool = False):
+        """Show a notice below the counter, or hide it when message is None"""
+        if message is not None:
+            self.status_label.set_text(message)
+        if busy:
+            self.status_label.classes(add=TextStyles.STATUS_BUSY)
+        else:
+            self.status_label.classes(remove=TextStyles.STATUS_BUSY)
+        self.status_label.set_visibility(message is not None)
+
+    def show_value(self, value: int):
+        """Show a value and enable the +/- buttons only while they can still apply"""
+        self.counter_display.set_text(str(value))
+        self.decrement_button.set_enabled(self.min_value is None or value > self.min_value)
+        self.increment_button.set_enabled(self.max_value is None or value < self.max_value)
+
+    async def update_counter_display(self):
+        """Update the counter display with current value, or the last known one if the database is down"""
+        with span("ui.update_counter_display"):
+            # Read in a worker thread so a slow or unreachable database cannot stall other clients
+            reading = await asyncio.to_thread(CounterService.get_reading, self.session_key)
+        if reading.value is None:
+            self.counter_display.set_text("—")
+        else:
+            self.show_value(reading.value)
+        self.show_status(STALE_MESSAGE if reading.stale else None)
+
+    def show_busy(self):
+        """Tell the user their click was turned away because too many writes are pending"""
+        self.show_status(BUSY_MESSAGE, busy=True)
+        ui.notify(BUSY_MESSAGE, type="warning", position="top")
+
+    async def handle_add(self, delta: int, verb: str, notify_type: Literal["positive", "info"]):
+        """Add delta within the configured bounds and report the outcome"""
+        try:
+            # Wait for the database in a worker thread so a click storm cannot stall the event loop;
+            # admission turns clicks away here, before they queue up for a thread
+            result = await WRITE_ADMISSION.run_in_thread(
+                CounterService.add,
+                delta,
+                self.min_value,
+                self.max_value,
+                idempotency_key=uuid4().hex,
+                session_key=self.session_key,
+            )
+            self.show_value(result.value)
+            self.show_status(None)
+            if result.applied:
+                ui.notify(f"Counter {verb} to {result.value}", type=notify_type, position="top")
+            else:
+                # Only the bound in the direction of the move can refuse it
+                limit, bound = ("maximum", self.max_value) if delta > 0 else ("minimum", self.min_value)
+                ui.notify(f"Counter stays at {result.value}, its {limit} is {bound}", type="warning", position="top")
+        except AdmissionRejectedError:
+            self.show_busy()
+        except Exception as e:
+            logger.error(f"Error updating counter: {str(e)}")
+            ui.notify(f"Error updating counter: {str(e)}", type="negative")
+
+    async def handle_increment(self):
+        """Handle increment button click"""
+        with span("ui.handle_increment"):
+            await self.handle_add(1, "incremented", "positive")
+
+    async def handle_decrement(self):
+        """Handle decrement button click"""
+        with span("ui.handle_decrement"):
+            await self.handle_add(-1, "decremented", "info")
+
+    async def handle_reset(self):
+        """Handle reset button click"""
+        with span("ui.handle_reset"):
             try:
-                new_value = CounterService.reset_counter()
-                counter_display.set_text(str(new_value))
-                ui.notify("Counter reset to 0", type="warning", position="top")
+                new_value = await WRITE_ADMISSION.run_in_thread(
+                    CounterService.reset_counter,
+                    idempotency_key=uuid4().hex,
+                    session_key=self.session_key,
+                    value=self.reset_target,
+                )
+                self.show_value(new_value)
+                self.show_status(None)
+                ui.notify(f"Counter reset to {new_value}", type="warning", position="top")
+            except AdmissionRejectedError:
+                self.show_busy()
             except Exception as e:
                 logger.error(f"Error resetting counter: {str(e)}")
                 ui.notify(f"Error resetting counter: {str(e)}", type="negative")
 
+
+def create(min_value: Optional[int] = COUNTER_MIN, max_value: Optional[int] = COUNTER_MAX):
+    """Create the counter application UI"""
+    apply_modern_theme()
+    # Reset goes to 0, or to the nearest bound if 0 is out of range
+    reset_target = max(min_value, 0) if min_value is not None else 0
+    reset_target = min(max_value, reset_target) if max_value is not None else reset_target
+    # Pages bind to the shared text, so a client costs no timer of its own
+    RATES_DISPLAY.refresh()
+    app.timer(RATES_REFRESH_INTERVAL, RATES_DISPLAY.refresh)
+
+    @ui.page("/", reconnect_timeout=RECONNECT_TIMEOUT)
+    async def counter_page():
+        page = CounterPage(min_value, max_value, reset_target, app.storage.browser.get("id"))
         # Initialize counter display
-        update_counter_display()
+        await page.update_counter_display()
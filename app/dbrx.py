@@ -4,12 +4,14 @@ from databricks.sdk.service.sql import StatementState, State
 
 from pydantic import BaseModel
 from logging import getLogger
+from app.tracing import traced
 
 logger = getLogger(__name__)
 
 T = TypeVar("T", bound="DatabricksModel")
 
 
+@traced("databricks.query")
 def execute_databricks_query(query: str) -> List[Dict[str, Any]]:
     """helper function to execute SQL query via WorkspaceClient"""
     client = WorkspaceClient()
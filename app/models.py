@@ -1,7 +1,12 @@
+import os
+from sqlalchemy import DDL, PrimaryKeyConstraint, event
 from sqlmodel import SQLModel, Field
 from typing import Optional
 from datetime import datetime
 
+# Number of hash partitions of user_counters on Postgres; changing it requires recreating the table
+USER_COUNTER_PARTITIONS = int(os.environ.get("APP_USER_COUNTER_PARTITIONS", "16"))
+
 
 class Counter(SQLModel, table=True):
     """Model to store counter state"""
@@ -14,8 +19,75 @@ class Counter(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class CounterOperation(SQLModel, table=True):
+    """Model to record applied counter operations by idempotency key"""
+
+    __tablename__ = "counter_operations"  # type: ignore[assignment]
+
+    idempotency_key: str = Field(primary_key=True, max_length=64)
+    operation: str = Field(max_length=20)
+    result_value: int
+    created_at: datetime = Field(default_factory=datetime.utcnow, index=True)
+
+
+class UserCounter(SQLModel, table=True):
+    """Model to store one counter per user, hash-partitioned by user id on Postgres"""
+
+    __tablename__ = "user_counters"  # type: ignore[assignment]
+    __table_args__ = (
+        # Covering primary key: reads of a user's value are index-only scans on a single partition
+        PrimaryKeyConstraint("user_id", postgresql_include=["value"]),
+        {"postgresql_partition_by": "HASH (user_id)"},
+    )
+
+    user_id: str = Field(primary_key=True, max_length=64)
+    value: int = Field(default=0)
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
+for _remainder in range(USER_COUNTER_PARTITIONS):
+    event.listen(
+        UserCounter.__table__,  # type: ignore[attr-defined]
+        "after_create",
+        DDL(
+            f"CREATE TABLE user_counters_p{_remainder} PARTITION OF user_counters "
+            f"FOR VALUES WITH (MODULUS {USER_COUNTER_PARTITIONS}, REMAINDER {_remainder})"
+        ).execute_if(dialect="postgresql"),
+    )
+
+
+class CounterRate(SQLModel, table=True):
+    """Model to share each process's recent counter activity, merged into cross-process rates"""
+
+    __tablename__ = "counter_rates"  # type: ignore[assignment]
+
+    process_id: str = Field(primary_key=True, max_length=64)
+    counter: str = Field(primary_key=True, max_length=64)
+    events_1s: int = Field(default=0)
+    events_1m: int = Field(default=0)
+    events_15m: int = Field(default=0)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 # Non-persistent schema for counter operations
 class CounterUpdate(SQLModel, table=False):
     """Schema for counter update operations"""
 
     value: int
+
+
+class CounterUpdateResult(SQLModel, table=False):
+    """Schema for the outcome of a conditional counter update"""
+
+    applied: bool
+    value: int
+    # True when the idempotency key was already recorded and the earlier outcome is returned
+    replayed: bool = False
+
+
+class CounterReading(SQLModel, table=False):
+    """Schema for a counter value that may come from the last known state"""
+
+    value: Optional[int] = None
+    stale: bool = False
@@ -0,0 +1,54 @@
+import sys
+import threading
+import time
+from collections import Counter as StackCounter
+from types import FrameType
+from typing import List, Optional
+
+MAX_PROFILE_SECONDS = 60.0
+DEFAULT_INTERVAL = 0.005
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({code.co_filename}:{code.co_firstlineno})"
+
+
+def _collapse(frame: Optional[FrameType], thread_name: str) -> str:
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(thread_name)
+    # Root first, separated by semicolons: the "collapsed stack" format read by flamegraph.pl and speedscope
+    return ";".join(reversed(labels))
+
+
+class SamplingProfiler:
+    """Sample the stacks of all threads in the live process at a fixed interval"""
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL):
+        if interval <= 0:
+            raise ValueError("interval must be positive")
+        self.interval = interval
+        self.samples: StackCounter[str] = StackCounter()
+        self.sample_count = 0
+
+    def run(self, seconds: float) -> None:
+        """Collect samples for the given number of seconds, blocking the calling thread"""
+        if not 0 < seconds <= MAX_PROFILE_SECONDS:
+            raise ValueError(f"seconds must be between 0 and {MAX_PROFILE_SECONDS}")
+        own_id = threading.get_ident()
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                self.samples[_collapse(frame, names.get(thread_id, f"thread-{thread_id}"))] += 1
+            self.sample_count += 1
+            time.sleep(self.interval)
+
+    def collapsed(self) -> str:
+        """Return the samples as collapsed stacks, one "stack count" line each, most frequent first"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
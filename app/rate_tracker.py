@@ -0,0 +1,169 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Tuple
+from uuid import uuid4
+from nicegui import app
+from sqlalchemy import Engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, delete, select
+from app.database import ENGINE
+from app.models import CounterRate
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Window name -> length in seconds; each window has an events_<name> column in counter_rates
+RATE_WINDOWS: Dict[str, int] = {"1s": 1, "1m": 60, "15m": 900}
+# How often each process publishes its own window totals and loads those of the other processes
+RATE_MERGE_INTERVAL = float(os.environ.get("APP_RATE_MERGE_SECONDS", "5"))
+# Totals not refreshed for this long belong to a stopped process and are dropped
+RATE_STALE_AFTER = timedelta(seconds=3 * RATE_MERGE_INTERVAL)
+# Another process's totals are up to two merge intervals old when read, so only windows much longer than that
+# include them; shorter windows (1s) report this process alone instead of activity that ended seconds ago
+RATE_MERGED_WINDOWS = frozenset(name for name, seconds in RATE_WINDOWS.items() if seconds > 2 * RATE_MERGE_INTERVAL)
+# Identifies this process's row in counter_rates, unique even when a restart reuses the pid
+PROCESS_ID = f"{socket.gethostname()[:40]}-{os.getpid()}-{uuid4().hex[:8]}"
+
+
+class EventRing:
+    """Per-second event counts for the most recent seconds in a fixed-size ring"""
+
+    def __init__(self, size: int):
+        self._counts = array("q", [0] * size)
+        self._seconds = array("q", [-1] * size)
+
+    def add(self, second: int, count: int) -> None:
+        slot = second % len(self._counts)
+        if self._seconds[slot] != second:
+            # The slot still holds a second that has left the ring
+            self._seconds[slot] = second
+            self._counts[slot] = 0
+        self._counts[slot] += count
+
+    def total(self, first: int, last: int) -> int:
+        """Sum the events from second first to second last, inclusive"""
+        size = len(self._counts)
+        return sum(
+            self._counts[second % size] for second in range(first, last + 1) if self._seconds[second % size] == second
+        )
+
+
+class RateTracker:
+    """Track counter events and report rates over the 1s/1m/15m windows.
+
+    Recording is O(1) and each counter holds one ring of 900 per-second slots. Windows cover the
+    complete seconds before now; those in RATE_MERGED_WINDOWS also include the totals last merged
+    from other processes, the others count this process only.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self._size = max(RATE_WINDOWS.values())
+        self._clock = clock
+        self._rings: Dict[str, EventRing] = {}
+        self._remote: Dict[str, Dict[str, int]] = {}
+        # Rates only change once per second, so every page refreshing within that second shares one computation
+        self._cached: Dict[str, Tuple[int, Dict[str, float]]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, counter: str, count: int = 1) -> None:
+        second = int(self._clock())
+        with self._lock:
+            ring = self._rings.get(counter)
+            if ring is None:
+                ring = self._rings[counter] = EventRing(self._size)
+            ring.add(second, count)
+
+    def local_events(self) -> Dict[str, Dict[str, int]]:
+        """Return the events recorded by this process in each window, per counter"""
+        last = int(self._clock()) - 1
+        with self._lock:
+            return {counter: self._window_totals(ring, last) for counter, ring in self._rings.items()}
+
+    def set_remote_events(self, remote: Dict[str, Dict[str, int]]) -> None:
+        """Replace the window totals of the other processes, per counter"""
+        with self._lock:
+            self._remote = remote
+            self._cached.clear()
+
+    def rates(self, counter: str) -> Dict[str, float]:
+        """Return events per second in each window for one counter, across all processes for merged windows"""
+        last = int(self._clock()) - 1
+        with self._lock:
+            return self._rates(counter, last)
+
+    def all_rates(self) -> Dict[str, Dict[str, float]]:
+        """Return the rates of every counter seen locally or in another process"""
+        last = int(self._clock()) - 1
+        with self._lock:
+            return {counter: self._rates(counter, last) for counter in self._rings.keys() | self._remote.keys()}
+
+    def _window_totals(self, ring: EventRing, last: int) -> Dict[str, int]:
+        return {name: ring.total(last - seconds + 1, last) for name, seconds in RATE_WINDOWS.items()}
+
+    def _rates(self, counter: str, last: int) -> Dict[str, float]:
+        cached = self._cached.get(counter)
+        if cached is not None and cached[0] == last:
+            return dict(cached[1])
+        ring = self._rings.get(counter)
+        local = self._window_totals(ring, last) if ring is not None else {}
+        remote = {name: total for name, total in self._remote.get(counter, {}).items() if name in RATE_MERGED_WINDOWS}
+        rates = {name: (local.get(name, 0) + remote.get(name, 0)) / seconds for name, seconds in RATE_WINDOWS.items()}
+        self._cached[counter] = (last, rates)
+        return dict(rates)
+
+
+RATE_TRACKER = RateTracker()
+
+
+def merge_rates(
+    tracker: RateTracker = RATE_TRACKER,
+    engine: Engine = ENGINE,
+    process_id: str = PROCESS_ID,
+    now: Optional[datetime] = None,
+) -> None:
+    """Publish this process's window totals and load the totals of the other live processes"""
+    now = now or datetime.utcnow()
+    insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    remote: Dict[str, Dict[str, int]] = {}
+    with Session(engine) as session:
+        for counter, events in tracker.local_events().items():
+            columns = {f"events_{name}": total for name, total in events.items()}
+            statement = insert(CounterRate).values(process_id=process_id, counter=counter, updated_at=now, **columns)
+            session.execute(
+                statement.on_conflict_do_update(
+                    index_elements=["process_id", "counter"], set_={**columns, "updated_at": now}
+                )
+            )
+        session.exec(delete(CounterRate).where(CounterRate.updated_at < now - RATE_STALE_AFTER))  # type: ignore
+        for row in session.exec(select(CounterRate).where(CounterRate.process_id != process_id)):
+            totals = remote.setdefault(row.counter, dict.fromkeys(RATE_WINDOWS, 0))
+            for name in RATE_WINDOWS:
+                totals[name] += getattr(row, f"events_{name}")
+        session.commit()
+    tracker.set_remote_events(remote)
+
+
+def create():
+    """Register the counter rates endpoint and the periodic merge of rates across processes"""
+
+    async def merge():
+        try:
+            await asyncio.to_thread(merge_rates)
+        except Exception as e:
+            logger.warning(f"Error merging counter rates: {str(e)}")
+
+    app.timer(RATE_MERGE_INTERVAL, merge, immediate=False)
+
+    @app.get("/metrics/rates")
+    async def counter_rates():
+        return {
+            "process_id": PROCESS_ID,
+            "windows": RATE_WINDOWS,
+            "merged_windows": sorted(RATE_MERGED_WINDOWS, key=RATE_WINDOWS.__getitem__),
+            "counters": RATE_TRACKER.all_rates(),
+        }
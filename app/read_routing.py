@@ -0,0 +1,111 @@
+import functools
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, TypeVar
+from sqlalchemy import Engine
+from sqlalchemy.exc import DBAPIError
+from app.circuit_breaker import DB_BREAKER, CircuitBreaker, CircuitOpenError, CircuitState
+from app.database import ENGINE, REPLICA_ENGINES
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# How long a session reads from the primary after it wrote; should exceed the expected replication lag
+READ_YOUR_WRITES_WINDOW = float(os.environ.get("APP_READ_YOUR_WRITES_SECONDS", "5"))
+# How long a replica that failed is skipped before it is tried again
+REPLICA_COOLDOWN = float(os.environ.get("APP_REPLICA_COOLDOWN_SECONDS", "30"))
+# A replica read slower than this still returns its result, but the replica is skipped for the cooldown
+REPLICA_LATENCY_BUDGET = float(os.environ.get("APP_REPLICA_LATENCY_BUDGET_MS", "250")) / 1000
+# Forget write timestamps once this many sessions are tracked and their windows have passed
+MAX_TRACKED_SESSIONS = 10_000
+
+
+class ReadRouter:
+    """Route reads to read replicas with round-robin load balancing and failover to the primary.
+
+    A session that wrote within the read-your-writes window reads from the primary, so it never
+    sees a value older than its own write. Each replica has its own breaker, which opens on the first
+    database error or slow read, so a failing replica never counts against `primary_breaker`.
+    """
+
+    def __init__(
+        self,
+        primary: Engine,
+        replicas: Sequence[Engine],
+        read_your_writes_window: float = READ_YOUR_WRITES_WINDOW,
+        replica_cooldown: float = REPLICA_COOLDOWN,
+        replica_latency_budget: Optional[float] = REPLICA_LATENCY_BUDGET,
+        primary_breaker: Optional[CircuitBreaker] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.read_your_writes_window = read_your_writes_window
+        self.replica_cooldown = replica_cooldown
+        self.primary_breaker = primary_breaker
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._next_replica = 0
+        self._replica_breakers = [
+            CircuitBreaker(
+                f"replica-{index}",
+                failure_threshold=1,
+                reset_timeout=replica_cooldown,
+                latency_budget=replica_latency_budget,
+                is_failure=lambda error: isinstance(error, DBAPIError),
+                clock=clock,
+            )
+            for index in range(len(self.replicas))
+        ]
+        self._last_write: Dict[str, float] = {}
+
+    def mark_write(self, session_key: Optional[str]) -> None:
+        """Remember that a session just wrote, pinning its reads to the primary for a while"""
+        if session_key is None:
+            return
+        now = self._clock()
+        with self._lock:
+            self._last_write[session_key] = now
+            if len(self._last_write) > MAX_TRACKED_SESSIONS:
+                cutoff = now - self.read_your_writes_window
+                self._last_write = {key: at for key, at in self._last_write.items() if at >= cutoff}
+
+    def read_engines(self, session_key: Optional[str] = None) -> List[Engine]:
+        """Return the engines to try for a read, in order; the primary is always last"""
+        now = self._clock()
+        with self._lock:
+            if session_key is not None:
+                written_at = self._last_write.get(session_key)
+                if written_at is not None and now - written_at < self.read_your_writes_window:
+                    return [self.primary]
+            # Rotate the starting replica on every read; the others follow as failover targets
+            start = self._next_replica
+            self._next_replica = (start + 1) % max(len(self.replicas), 1)
+            indexes = [(start + offset) % len(self.replicas) for offset in range(len(self.replicas))]
+        candidates = [
+            self.replicas[index] for index in indexes if self._replica_breakers[index].state != CircuitState.OPEN
+        ]
+        return candidates + [self.primary]
+
+    def run_read(self, func: Callable[[Engine], T], session_key: Optional[str] = None) -> T:
+        """Run a read-only func against a replica, failing over to the next replica and finally the primary"""
+        engines = self.read_engines(session_key)
+        for engine in engines[:-1]:
+            breaker = self._replica_breakers[self.replicas.index(engine)]
+            try:
+                return breaker.call(functools.partial(func, engine))
+            except CircuitOpenError:
+                # Another read is already probing this replica
+                continue
+            except DBAPIError as e:
+                logger.warning(f"Read replica {engine.url!r} failed, failing over: {str(e)}")
+        if self.primary_breaker is None:
+            return func(self.primary)
+        return self.primary_breaker.call(lambda: func(self.primary))
+
+
+# Only reads served by the primary go through the global database breaker
+READ_ROUTER = ReadRouter(ENGINE, REPLICA_ENGINES, primary_breaker=DB_BREAKER)
@@ -0,0 +1,58 @@
+import os
+import random
+import time
+from typing import Callable, Tuple, Type, TypeVar
+from sqlalchemy.exc import DBAPIError, IntegrityError, OperationalError
+import logging
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+RETRY_ATTEMPTS = int(os.environ.get("APP_DB_RETRY_ATTEMPTS", "3"))
+RETRY_BASE_DELAY = float(os.environ.get("APP_DB_RETRY_BASE_DELAY", "0.05"))
+RETRY_MAX_DELAY = float(os.environ.get("APP_DB_RETRY_MAX_DELAY", "1.0"))
+
+# Timeouts, dropped connections and concurrent inserts of the same idempotency key
+RETRYABLE_ERRORS: Tuple[Type[BaseException], ...] = (OperationalError, IntegrityError)
+# SQLSTATE of "prepared statement does not exist", e.g. after DISCARD ALL or a pooler switching server connections;
+# the failed attempt forgets the statement, so the next one prepares it again
+INVALID_STATEMENT_NAME = "26000"
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Check whether a database error may succeed when the operation is repeated"""
+    if isinstance(error, RETRYABLE_ERRORS):
+        return True
+    if not isinstance(error, DBAPIError):
+        return False
+    return error.connection_invalidated or getattr(error.orig, "pgcode", None) == INVALID_STATEMENT_NAME
+
+
+def backoff_delay(attempt: int, base_delay: float = RETRY_BASE_DELAY, max_delay: float = RETRY_MAX_DELAY) -> float:
+    """Return a full-jitter exponential backoff delay for the given attempt (starting at 0)"""
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+def retry_with_backoff(
+    func: Callable[[], T],
+    attempts: int = RETRY_ATTEMPTS,
+    base_delay: float = RETRY_BASE_DELAY,
+    max_delay: float = RETRY_MAX_DELAY,
+) -> T:
+    """Call func, retrying retryable database errors with jittered exponential backoff.
+
+    Only use this for operations that are safe to repeat, e.g. writes guarded by an idempotency key.
+    """
+    if attempts < 1:
+        raise ValueError("attempts must be at least 1")
+    for attempt in range(attempts):
+        try:
+            return func()
+        except Exception as e:
+            if attempt == attempts - 1 or not is_retryable(e):
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay)
+            logger.warning(f"Retrying after error (attempt {attempt + 1}/{attempts}, delay {delay:.3f}s): {str(e)}")
+            time.sleep(delay)
+    raise AssertionError("unreachable")
@@ -1,8 +1,22 @@
 from app.database import create_tables
+from app.tracing import install_sql_tracing
+import app.admin
+import app.admission
+import app.client_metrics
+import app.counter_service
 import app.counter_ui
+import app.rate_tracker
+import app.user_counter_ui
 
 
 def startup() -> None:
     # this function is called before the first request
+    install_sql_tracing()
     create_tables()
+    app.admin.create()
+    app.admission.create()
+    app.client_metrics.create()
+    app.counter_service.create()
+    app.rate_tracker.create()
     app.counter_ui.create()
+    app.user_counter_ui.create()
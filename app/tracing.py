@@ -0,0 +1,175 @@
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional, Protocol, TypeVar
+from uuid import uuid4
+from sqlalchemy import Engine, event
+import logging
+
+logger = logging.getLogger(__name__)
+
+F = TypeVar("F", bound=Callable[..., Any])
+
+# "memory" keeps recent spans for /admin/traces, "file:<path>" appends JSON lines, "off" disables tracing
+TRACE_EXPORT = os.environ.get("APP_TRACE_EXPORT", "memory")
+TRACE_BUFFER_SIZE = int(os.environ.get("APP_TRACE_BUFFER_SIZE", "2000"))
+MAX_STATEMENT_LENGTH = 500
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_time: float
+    duration_ms: float = 0.0
+    error: Optional[str] = None
+    attributes: Dict[str, Any] = field(default_factory=dict)
+
+
+class SpanExporter(Protocol):
+    def export(self, span: Span) -> None: ...
+
+
+class InMemoryExporter:
+    """Keep the most recent finished spans in a bounded buffer"""
+
+    def __init__(self, max_spans: int = TRACE_BUFFER_SIZE):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        with self._lock:
+            self._spans.append(span)
+
+    def spans(self, trace_id: Optional[str] = None) -> List[Span]:
+        with self._lock:
+            spans = list(self._spans)
+        if trace_id is None:
+            return spans
+        return [span for span in spans if span.trace_id == trace_id]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class FileExporter:
+    """Append finished spans as JSON lines to a local file"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def export(self, span: Span) -> None:
+        line = json.dumps(asdict(span), default=str)
+        with self._lock, self.path.open("a", encoding="utf-8") as file:
+            file.write(line + "\n")
+
+
+def _create_exporter(setting: str) -> Optional[SpanExporter]:
+    if setting == "off":
+        return None
+    if setting.startswith("file:"):
+        return FileExporter(Path(setting.removeprefix("file:")))
+    return InMemoryExporter()
+
+
+EXPORTER: Optional[SpanExporter] = _create_exporter(TRACE_EXPORT)
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    """Replace the active exporter, e.g. to collect spans in tests; None disables tracing"""
+    global EXPORTER
+    EXPORTER = exporter
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Record a span around a block; nested spans share the trace id of the enclosing span"""
+    exporter = EXPORTER
+    if exporter is None:
+        yield None
+        return
+    parent = _current_span.get()
+    new_span = Span(
+        name=name,
+        trace_id=parent.trace_id if parent is not None else uuid4().hex,
+        span_id=uuid4().hex[:16],
+        parent_id=parent.span_id if parent is not None else None,
+        start_time=time.time(),
+        attributes=attributes,
+    )
+    token = _current_span.set(new_span)
+    started = time.perf_counter()
+    try:
+        yield new_span
+    except BaseException as e:
+        new_span.error = f"{type(e).__name__}: {str(e)}"
+        raise
+    finally:
+        new_span.duration_ms = (time.perf_counter() - started) * 1000
+        _current_span.reset(token)
+        try:
+            exporter.export(new_span)
+        except Exception as e:
+            logger.warning(f"Error exporting span {name}: {str(e)}")
+
+
+def traced(name: str) -> Callable[[F], F]:
+    """Decorator recording a span for every call of the wrapped function"""
+
+    def decorator(func: F) -> F:
+        @functools.wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return func(*args, **kwargs)
+
+        return wrapper  # type: ignore[return-value]
+
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if EXPORTER is None:
+        return
+    manager = span("sql", statement=statement[:MAX_STATEMENT_LENGTH], database=conn.engine.url.database)
+    manager.__enter__()
+    conn.info.setdefault("trace_spans", []).append(manager)
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    managers = conn.info.get("trace_spans")
+    if managers:
+        managers.pop().__exit__(None, None, None)
+
+
+def _handle_error(exception_context) -> None:
+    connection = exception_context.connection
+    managers = connection.info.get("trace_spans") if connection is not None else None
+    if managers:
+        error = exception_context.original_exception
+        managers.pop().__exit__(type(error), error, None)
+
+
+def install_sql_tracing() -> None:
+    """Record a span for every SQL statement executed by any engine"""
+    if event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
@@ -0,0 +1,79 @@
+from datetime import datetime
+from typing import Any
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlmodel import Session, select
+from app.admission import WRITE_ADMISSION
+from app.circuit_breaker import DB_BREAKER
+from app.database import ENGINE
+from app.models import UserCounter
+from app.tracing import traced
+import logging
+
+logger = logging.getLogger(__name__)
+
+MAX_USER_ID_LENGTH = 64
+
+
+def _check_user_id(user_id: str) -> None:
+    if not user_id or len(user_id) > MAX_USER_ID_LENGTH:
+        raise ValueError(f"user_id must be between 1 and {MAX_USER_ID_LENGTH} characters")
+
+
+def _upsert(user_id: str, value: Any, set_value: Any) -> Any:
+    """Build an INSERT ... ON CONFLICT (user_id) DO UPDATE returning the stored value"""
+    insert = postgresql.insert if ENGINE.dialect.name == "postgresql" else sqlite.insert
+    now = datetime.utcnow()
+    statement = insert(UserCounter).values(user_id=user_id, value=value, created_at=now, updated_at=now)
+    return statement.on_conflict_do_update(
+        index_elements=["user_id"], set_={"value": set_value(statement.excluded), "updated_at": now}
+    ).returning(UserCounter.value)  # type: ignore[arg-type]
+
+
+class UserCounterService:
+    """Service class to handle per-user counter operations.
+
+    Every operation is a single statement on the user's primary key, so it touches one partition
+    and one index entry regardless of how many users exist. A user without a row reads as 0.
+    Writes share the admission limit of the global counter, since both draw on the same pool.
+    """
+
+    @staticmethod
+    @traced("user_counter_service.get_value")
+    def get_value(user_id: str) -> int:
+        """Get the counter value of a user"""
+        _check_user_id(user_id)
+
+        def read() -> int:
+            with Session(ENGINE) as session:
+                value = session.exec(select(UserCounter.value).where(UserCounter.user_id == user_id)).first()
+                return 0 if value is None else value
+
+        return DB_BREAKER.call(read)
+
+    @staticmethod
+    @traced("user_counter_service.add")
+    def add(user_id: str, delta: int) -> int:
+        """Add delta to a user's counter, creating it if needed, and return the new value"""
+        _check_user_id(user_id)
+        statement = _upsert(user_id, delta, lambda excluded: UserCounter.value + excluded.value)
+        return UserCounterService._write(statement)
+
+    @staticmethod
+    @traced("user_counter_service.reset")
+    def reset(user_id: str) -> int:
+        """Reset a user's counter to 0 and return new value"""
+        _check_user_id(user_id)
+        statement = _upsert(user_id, 0, lambda excluded: excluded.value)
+        return UserCounterService._write(statement)
+
+    @staticmethod
+    def _write(statement: Any) -> int:
+        # Admission comes first so that rejected writes never wait for a connection or count as database failures
+        return WRITE_ADMISSION.call(lambda: DB_BREAKER.call(lambda: UserCounterService._execute(statement)))
+
+    @staticmethod
+    def _execute(statement: Any) -> int:
+        with Session(ENGINE) as session:
+            value = session.execute(statement).scalar_one()
+            session.commit()
+            return value
@@ -0,0 +1,83 @@
+import asyncio
+from nicegui import app, ui
+from app.admission import WRITE_ADMISSION, AdmissionRejectedError
+from app.counter_ui import BUSY_MESSAGE, RECONNECT_TIMEOUT, ButtonStyles, TextStyles, apply_modern_theme
+from app.tracing import span
+from app.user_counter_service import UserCounterService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def current_user_id() -> str:
+    """Return the signed-in user's id, or the browser session id for anonymous visitors"""
+    user_id = app.storage.user.get("user_id")
+    if user_id is not None:
+        return str(user_id)
+    return str(app.storage.browser["id"])
+
+
+def create():
+    """Create the per-user counter UI"""
+    apply_modern_theme()
+
+    @ui.page("/me", reconnect_timeout=RECONNECT_TIMEOUT)
+    async def user_counter_page():
+        user_id = current_user_id()
+
+        with ui.column().classes("counter-page"):
+            with ui.card().classes("counter-card"):
+                ui.label("My Counter").classes(TextStyles.HEADING)
+                ui.label("Your own counter, separate from everyone else's").classes(TextStyles.SUBHEADING)
+                counter_display = ui.label().classes(TextStyles.COUNTER_DISPLAY).mark("user-counter-display")
+                status_label = ui.label(BUSY_MESSAGE).classes(f"{TextStyles.STATUS} {TextStyles.STATUS_BUSY}")
+                status_label.mark("user-counter-status").set_visibility(False)
+
+                def show_value(value: int):
+                    """Show a written value and clear an earlier busy notice"""
+                    counter_display.set_text(str(value))
+                    status_label.set_visibility(False)
+
+                def show_busy():
+                    """Tell the user their click was turned away because too many writes are pending"""
+                    status_label.set_visibility(True)
+                    ui.notify(BUSY_MESSAGE, type="warning", position="top")
+
+                async def handle_add(delta: int):
+                    """Handle +/- button clicks"""
+                    with span("ui.user_counter.add"):
+                        try:
+                            # Same dispatch as the global counter: off the event loop, behind write admission
+                            show_value(await WRITE_ADMISSION.run_in_thread(UserCounterService.add, user_id, delta))
+                        except AdmissionRejectedError:
+                            show_busy()
+                        except Exception as e:
+                            logger.error(f"Error updating user counter: {str(e)}")
+                            ui.notify(f"Error updating counter: {str(e)}", type="negative")
+
+                async def handle_reset():
+                    """Handle reset button click"""
+                    with span("ui.user_counter.reset"):
+                        try:
+                            show_value(await WRITE_ADMISSION.run_in_thread(UserCounterService.reset, user_id))
+                        except AdmissionRejectedError:
+                            show_busy()
+                        except Exception as e:
+                            logger.error(f"Error resetting user counter: {str(e)}")
+                            ui.notify(f"Error resetting counter: {str(e)}", type="negative")
+
+                with ui.row().classes("counter-buttons"):
+                    ui.button("-", on_click=lambda: handle_add(-1)).classes(ButtonStyles.DECREMENT).mark(
+                        "user-decrement-button"
+                    )
+                    ui.button("+", on_click=lambda: handle_add(1)).classes(ButtonStyles.INCREMENT).mark(
+                        "user-increment-button"
+                    )
+                ui.button("Reset", on_click=handle_reset).classes(ButtonStyles.RESET).mark("user-reset-button")
+
+        try:
+            # Read in a worker thread so a slow or unreachable database cannot stall other clients
+            counter_display.set_text(str(await asyncio.to_thread(UserCounterService.get_value, user_id)))
+        except Exception as e:
+            logger.error(f"Error loading user counter: {str(e)}")
+            counter_display.set_text("—")
@@ -1,6 +1,7 @@
 import logging
 import os
 from app.startup import startup
+from app.circuit_breaker import DB_BREAKER, CircuitState
 from nicegui import app, ui
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -23,7 +24,9 @@ class SecurityHeadersMiddleware(BaseHTTPMiddleware):
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy", "service": "nicegui-app"}
+    database = DB_BREAKER.snapshot()
+    status = "healthy" if database["state"] == CircuitState.CLOSED.value else "degraded"
+    return {"status": status, "service": "nicegui-app", "database": database}
 
 
 # suppress sqlalchemy engine logs below warning level
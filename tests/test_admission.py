@@ -0,0 +1,268 @@
+import asyncio
+import contextvars
+import threading
+import time
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from nicegui.testing import User
+from app.admission import WRITE_ADMISSION, AdmissionController, AdmissionRejectedError
+from app.counter_service import CounterService
+from app.database import reset_db
+
+# Load test: many more concurrent writers than in-flight slots plus queue places
+LOAD_WRITERS = 64
+LOAD_OPS_PER_WRITER = 25
+# Concurrent clicks for the load test through the page's dispatch path
+LOAD_CLICKS = 256
+LOAD_CLICK_ROUNDS = 5
+
+
+@pytest.fixture
+def new_db():
+    """Fixture to provide a fresh database for each test"""
+    reset_db()
+    yield
+    reset_db()
+
+
+def hold_slots(controller: AdmissionController, count: int, release: threading.Event) -> List[threading.Thread]:
+    """Occupy in-flight slots until release is set"""
+    threads = [threading.Thread(target=controller.call, args=(release.wait,)) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    while controller.snapshot()["in_flight"] < count:
+        time.sleep(0.001)
+    return threads
+
+
+def wait_for_queue_depth(controller: AdmissionController, depth: int) -> None:
+    while controller.snapshot()["queue_depth"] < depth:
+        time.sleep(0.001)
+
+
+def test_invalid_limits_rejected():
+    with pytest.raises(ValueError):
+        AdmissionController("test", max_in_flight=0)
+    with pytest.raises(ValueError):
+        AdmissionController("test", max_queue=-1)
+
+
+def test_calls_within_limit_run():
+    controller = AdmissionController("test", max_in_flight=2, max_queue=0)
+    assert controller.call(lambda: 42) == 42
+    assert controller.snapshot()["total_admitted"] == 1
+    assert controller.snapshot()["in_flight"] == 0
+
+
+def test_rejects_at_once_when_queue_is_full():
+    """Test that a call beyond the queue depth fails fast instead of waiting"""
+    controller = AdmissionController("test", max_in_flight=1, max_queue=0, queue_timeout=10.0)
+    release = threading.Event()
+    threads = hold_slots(controller, 1, release)
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejectedError, match="busy"):
+        controller.call(lambda: None)
+    assert time.monotonic() - started < 0.1
+
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert controller.snapshot()["total_rejections"] == 1
+
+
+def test_waiting_call_rejected_after_queue_timeout():
+    """Test that a queued call gives up once the queue timeout passes"""
+    controller = AdmissionController("test", max_in_flight=1, max_queue=1, queue_timeout=0.05)
+    release = threading.Event()
+    threads = hold_slots(controller, 1, release)
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejectedError, match="no slot"):
+        controller.call(lambda: None)
+    assert 0.05 <= time.monotonic() - started < 1.0
+    assert controller.snapshot()["queue_depth"] == 0
+
+    release.set()
+    for thread in threads:
+        thread.join()
+
+
+def test_waiting_call_runs_when_slot_frees():
+    """Test that a queued call is admitted as soon as a running call finishes"""
+    controller = AdmissionController("test", max_in_flight=1, max_queue=1, queue_timeout=10.0)
+    release = threading.Event()
+    threads = hold_slots(controller, 1, release)
+
+    with ThreadPoolExecutor(1) as pool:
+        waiting = pool.submit(controller.call, lambda: "admitted")
+        wait_for_queue_depth(controller, 1)
+        release.set()
+        assert waiting.result(timeout=5) == "admitted"
+
+    for thread in threads:
+        thread.join()
+    snapshot = controller.snapshot()
+    assert snapshot["total_admitted"] == 2
+    assert snapshot["total_rejections"] == 0
+    assert snapshot["in_flight"] == 0
+
+
+def test_waiting_calls_admitted_in_arrival_order():
+    """Test that a newcomer does not take a freed slot ahead of a caller that is already waiting"""
+    controller = AdmissionController("test", max_in_flight=1, max_queue=4, queue_timeout=10.0)
+    release = threading.Event()
+    threads = hold_slots(controller, 1, release)
+    order: List[str] = []
+
+    with ThreadPoolExecutor(3) as pool:
+        first = pool.submit(controller.call, lambda: order.append("first"))
+        wait_for_queue_depth(controller, 1)
+        second = pool.submit(controller.call, lambda: order.append("second"))
+        wait_for_queue_depth(controller, 2)
+        release.set()
+        # Arrives while a slot is being handed to the waiters
+        late = pool.submit(controller.call, lambda: order.append("late"))
+        for future in (first, second, late):
+            future.result(timeout=5)
+
+    for thread in threads:
+        thread.join()
+    assert order == ["first", "second", "late"]
+
+
+def test_write_latency_bounded_under_overload(new_db):
+    """Load test: with far more writers than slots, p99 latency stays within the queue timeout plus one write"""
+    CounterService.get_or_create_counter()
+    before = WRITE_ADMISSION.snapshot()
+    latencies: List[float] = []
+    applied: List[int] = []
+
+    def writer():
+        for _ in range(LOAD_OPS_PER_WRITER):
+            started = time.perf_counter()
+            try:
+                CounterService.increment_counter()
+                applied.append(1)
+            except AdmissionRejectedError:
+                pass
+            latencies.append(time.perf_counter() - started)
+
+    with ThreadPoolExecutor(LOAD_WRITERS) as pool:
+        for future in [pool.submit(writer) for _ in range(LOAD_WRITERS)]:
+            future.result()
+
+    after = WRITE_ADMISSION.snapshot()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    assert p99 < WRITE_ADMISSION.queue_timeout + 0.5
+    assert after["in_flight"] == 0
+    assert after["queue_depth"] == 0
+    rejected = after["total_rejections"] - before["total_rejections"]
+    assert rejected > 0
+    assert rejected + len(applied) == LOAD_WRITERS * LOAD_OPS_PER_WRITER
+    assert CounterService.get_current_value() == len(applied)
+
+
+async def test_dispatch_rejects_on_event_loop_when_full():
+    """Test that a dispatched call is turned away before it reaches a thread once every thread is taken"""
+    controller = AdmissionController("test", max_in_flight=1, max_queue=1, queue_timeout=10.0)
+    release = threading.Event()
+    tasks = [asyncio.create_task(controller.run_in_thread(controller.call, release.wait)) for _ in range(2)]
+    while controller.snapshot()["queue_depth"] < 1:
+        await asyncio.sleep(0.001)
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejectedError, match="dispatched"):
+        await controller.run_in_thread(controller.call, lambda: None)
+    assert time.monotonic() - started < 0.1
+
+    release.set()
+    assert await asyncio.gather(*tasks) == [True, True]
+    snapshot = controller.snapshot()
+    assert snapshot["dispatched"] == 0
+    assert snapshot["total_rejections"] == 1
+
+
+async def test_dispatch_carries_caller_context():
+    """Test that a dispatched call sees the caller's context variables"""
+    controller = AdmissionController("test", max_in_flight=1, max_queue=0)
+    request_id: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="unset")
+    request_id.set("click-1")
+
+    assert await controller.run_in_thread(controller.call, request_id.get) == "click-1"
+
+
+async def test_click_latency_bounded_under_overload(new_db):
+    """Load test through the page's dispatch path: rejections happen on the event loop and p99 latency stays bounded"""
+    CounterService.get_or_create_counter()
+    before = WRITE_ADMISSION.snapshot()
+    latencies: List[float] = []
+    applied: List[int] = []
+
+    async def click():
+        started = time.perf_counter()
+        try:
+            await WRITE_ADMISSION.run_in_thread(CounterService.increment_counter)
+            applied.append(1)
+        except AdmissionRejectedError:
+            pass
+        latencies.append(time.perf_counter() - started)
+
+    for _ in range(LOAD_CLICK_ROUNDS):
+        await asyncio.gather(*(click() for _ in range(LOAD_CLICKS)))
+
+    after = WRITE_ADMISSION.snapshot()
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    assert p99 < WRITE_ADMISSION.queue_timeout + 0.5
+    assert after["dispatched"] == 0
+    rejected = after["total_rejections"] - before["total_rejections"]
+    assert rejected > 0
+    assert rejected + len(applied) == LOAD_CLICKS * LOAD_CLICK_ROUNDS
+    assert CounterService.get_current_value() == len(applied)
+
+
+async def test_counter_page_shows_busy_state(user: User, new_db) -> None:
+    """Test that a write turned away by admission control shows the busy notice and leaves the counter alone"""
+    await user.open("/")
+    await user.should_see(marker="counter-display", content="0")
+    await user.should_not_see(marker="counter-status")
+
+    release = threading.Event()
+    threads = hold_slots(WRITE_ADMISSION, WRITE_ADMISSION.max_in_flight, release)
+    try:
+        user.find(marker="increment-button").click()
+        await user.should_see(marker="counter-status", content="Server is busy", retries=20)
+        await user.should_see("Server is busy, please try again")
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    assert CounterService.get_current_value() == 0
+    user.find(marker="increment-button").click()
+    await user.should_see(marker="counter-display", content="1")
+    await user.should_not_see(marker="counter-status")
+
+
+async def test_user_counter_page_shows_busy_state(user: User, new_db) -> None:
+    """Test that /me writes go through write admission and show the busy notice when turned away"""
+    await user.open("/me")
+    await user.should_see(marker="user-counter-display", content="0")
+    await user.should_not_see(marker="user-counter-status")
+
+    release = threading.Event()
+    threads = hold_slots(WRITE_ADMISSION, WRITE_ADMISSION.max_in_flight, release)
+    try:
+        user.find(marker="user-increment-button").click()
+        await user.should_see(marker="user-counter-status", content="Server is busy", retries=20)
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+    user.find(marker="user-increment-button").click()
+    await user.should_see(marker="user-counter-display", content="1")
+    await user.should_not_see(marker="user-counter-status")
@@ -0,0 +1,217 @@
+"""Benchmarks behind the performance work, deselected by default.
+
+Run against the database in APP_DATABASE_URL with:
+    APP_TRACE_EXPORT=off python -m pytest -m benchmark -s tests/test_benchmarks.py
+"""
+
+import asyncio
+import gc
+import os
+import random
+import statistics
+import time
+from datetime import datetime
+from typing import Callable, List, Optional
+from uuid import uuid4
+import pytest
+from sqlalchemy import func, text, update
+from sqlmodel import Session, col, select
+from nicegui import Client
+from app import counter_queries
+from app.admission import WRITE_ADMISSION, AdmissionRejectedError
+from app.circuit_breaker import DB_BREAKER
+from app.client_metrics import get_process_memory_bytes
+from app.counter_queries import PREPARED_STATEMENT_MODES, set_prepared_statements
+from app.counter_service import CounterService
+from app.database import ENGINE, reset_db
+from app.models import Counter, CounterOperation
+from app.retry import retry_with_backoff
+from app.startup import startup
+from app.user_counter_service import UserCounterService
+
+pytestmark = pytest.mark.benchmark
+
+# Rows loaded into user_counters before timing per-user reads and writes
+BENCH_USERS = int(os.environ.get("APP_BENCH_USERS", "1000000"))
+BENCH_OPERATIONS = int(os.environ.get("APP_BENCH_OPERATIONS", "5000"))
+# Concurrent clicks per burst when overloading the write path
+BENCH_CLICKS = int(os.environ.get("APP_BENCH_CLICKS", "512"))
+# Counter pages opened when measuring memory per client
+BENCH_CLIENTS = int(os.environ.get("APP_BENCH_CLIENTS", "200"))
+
+
+@pytest.fixture
+def new_db():
+    """Fixture to provide a fresh database for each benchmark"""
+    reset_db()
+    yield
+    reset_db()
+
+
+def report(name: str, latencies: List[float]) -> None:
+    """Print mean, p50 and p99 of latencies given in seconds"""
+    latencies = sorted(latencies)
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    mean = statistics.mean(latencies)
+    print(f"\n{name:28} n={len(latencies)} mean {mean * 1000:.3f} ms  p50 {p50 * 1000:.3f} ms  p99 {p99 * 1000:.3f} ms")
+
+
+def time_calls(func: Callable[[], object], count: int = BENCH_OPERATIONS, warmup: int = 200) -> List[float]:
+    for _ in range(warmup):
+        func()
+    latencies: List[float] = []
+    for _ in range(count):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def test_user_counter_lookups(new_db):
+    """Per-user reads and writes with BENCH_USERS rows; a read must be an index-only scan of one partition"""
+    started = time.perf_counter()
+    with ENGINE.begin() as connection:
+        connection.execute(text("SET LOCAL statement_timeout = 0"))
+        connection.execute(
+            text(
+                "INSERT INTO user_counters (user_id, value, created_at, updated_at) "
+                "SELECT 'user-' || i, i % 100, now(), now() FROM generate_series(1, :users) i"
+            ),
+            {"users": BENCH_USERS},
+        )
+    with ENGINE.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("SET statement_timeout = 0"))
+        # Sets the visibility map, so index-only scans need no heap fetches
+        connection.execute(text("VACUUM ANALYZE user_counters"))
+        plan = connection.execute(
+            text("EXPLAIN (ANALYZE, BUFFERS) SELECT value FROM user_counters WHERE user_id = 'user-42'")
+        ).all()
+    print(f"\nloaded {BENCH_USERS} users in {time.perf_counter() - started:.1f}s")
+    print("\n".join(row[0] for row in plan))
+    assert "Index Only Scan" in plan[0][0]
+
+    def random_user() -> str:
+        return f"user-{random.randint(1, BENCH_USERS)}"
+
+    report("get_value", time_calls(lambda: UserCounterService.get_value(random_user())))
+    report("add", time_calls(lambda: UserCounterService.add(random_user(), 1)))
+    report("add (new user)", time_calls(lambda: UserCounterService.add(f"new-{random_user()}", 1)))
+
+
+def orm_get_current_value() -> Optional[int]:
+    """The counter read as CounterService did it before the prebuilt queries: an ORM select per call"""
+    with Session(ENGINE) as session:
+        return session.exec(select(Counter.value)).first()
+
+
+def orm_increment_counter(idempotency_key: str) -> int:
+    """The increment as CounterService did it before the prebuilt queries: load, mutate and flush through the ORM"""
+
+    def apply_once() -> int:
+        with Session(ENGINE) as session:
+            recorded = session.get(CounterOperation, idempotency_key)
+            if recorded is not None:
+                return recorded.result_value
+            counter = session.exec(select(Counter)).one()
+            counter.value = counter.value + 1
+            counter.updated_at = datetime.utcnow()
+            session.add(
+                CounterOperation(idempotency_key=idempotency_key, operation="increment", result_value=counter.value)
+            )
+            session.commit()
+            return counter.value
+
+    return DB_BREAKER.call(lambda: retry_with_backoff(apply_once))
+
+
+def orm_add(delta: int, min_value: int, max_value: int, idempotency_key: str) -> Optional[int]:
+    """The bounded add as CounterService did it before the prebuilt queries: an ORM UPDATE built per call"""
+
+    def apply_once() -> Optional[int]:
+        with Session(ENGINE) as session:
+            recorded = session.get(CounterOperation, idempotency_key)
+            if recorded is not None:
+                return recorded.result_value
+            first_counter_id = select(func.min(col(Counter.id))).scalar_subquery()
+            statement = (
+                update(Counter)
+                .where(
+                    col(Counter.id) == first_counter_id,
+                    col(Counter.value) + delta >= min_value,
+                    col(Counter.value) + delta <= max_value,
+                )
+                .values(value=col(Counter.value) + delta, updated_at=datetime.utcnow())
+                .returning(col(Counter.value))
+            )
+            value = session.execute(statement).scalar_one_or_none()
+            if value is None:
+                session.rollback()
+                return None
+            session.add(CounterOperation(idempotency_key=idempotency_key, operation="add", result_value=value))
+            session.commit()
+            return value
+
+    return DB_BREAKER.call(lambda: retry_with_backoff(apply_once))
+
+
+def test_counter_queries_before_prebuilt_statements(new_db):
+    """Counter reads and writes through the ORM Session/select code that the prebuilt queries replaced"""
+    CounterService.get_or_create_counter()
+    report("orm: get_current_value", time_calls(orm_get_current_value))
+    report("orm: increment_counter", time_calls(lambda: orm_increment_counter(uuid4().hex)))
+    report("orm: add (bounded)", time_calls(lambda: orm_add(1, -(10**9), 10**9, uuid4().hex)))
+
+
+@pytest.mark.parametrize("mode", PREPARED_STATEMENT_MODES)
+def test_counter_queries_by_prepared_statement_mode(new_db, mode):
+    """Counter reads and writes through prebuilt statements, and also prepared on the server"""
+    configured = counter_queries.PREPARED_STATEMENTS
+    set_prepared_statements(mode)
+    try:
+        CounterService.get_or_create_counter()
+        report(f"{mode}: get_current_value", time_calls(CounterService.get_current_value))
+        report(f"{mode}: increment_counter", time_calls(lambda: CounterService.increment_counter(uuid4().hex)))
+        report(f"{mode}: add (bounded)", time_calls(lambda: CounterService.add(1, -(10**9), 10**9, uuid4().hex)))
+    finally:
+        set_prepared_statements(configured)
+
+
+@pytest.mark.parametrize("dispatch", ["to_thread", "admission"])
+async def test_click_bursts(new_db, dispatch):
+    """Bursts of concurrent clicks, dispatched like the counter page did before and after admission on the loop"""
+    CounterService.get_or_create_counter()
+    latencies: List[float] = []
+    rejected = 0
+
+    async def click():
+        nonlocal rejected
+        started = time.perf_counter()
+        try:
+            if dispatch == "to_thread":
+                await asyncio.to_thread(CounterService.increment_counter)
+            else:
+                await WRITE_ADMISSION.run_in_thread(CounterService.increment_counter)
+        except AdmissionRejectedError:
+            rejected += 1
+        latencies.append(time.perf_counter() - started)
+
+    for _ in range(10):
+        await asyncio.gather(*(click() for _ in range(BENCH_CLICKS)))
+    report(f"{dispatch}: click", latencies)
+    print(f"rejected {rejected}/{len(latencies)}")
+
+
+async def test_memory_per_client(new_db, create_user):
+    """Resident memory and element count per open counter page"""
+    startup()
+    await create_user().open("/")
+    gc.collect()
+    before = get_process_memory_bytes()
+    users = [create_user() for _ in range(BENCH_CLIENTS)]
+    for user in users:
+        await user.open("/")
+    gc.collect()
+    per_client = (get_process_memory_bytes() - before) / BENCH_CLIENTS
+    pages = [client for client in Client.instances.values() if not client.shared and client.page.path == "/"]
+    print(f"\n{BENCH_CLIENTS} clients: {len(pages[-1].elements)} elements and {per_client / 1024:.1f} KiB RSS each")
@@ -0,0 +1,164 @@
+import pytest
+from sqlalchemy.exc import DataError, IntegrityError, OperationalError, ProgrammingError
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from app.circuit_breaker import CircuitBreaker, CircuitOpenError, CircuitState, is_availability_error
+
+
+class FakeClock:
+    """Manually advanced clock for deterministic breaker tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def fail():
+    raise RuntimeError("database down")
+
+
+def make_breaker(clock: FakeClock, **kwargs) -> CircuitBreaker:
+    return CircuitBreaker("test", failure_threshold=2, reset_timeout=10.0, clock=clock, **kwargs)
+
+
+def trip(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        with pytest.raises(RuntimeError):
+            breaker.call(fail)
+
+
+def test_closed_breaker_passes_calls_through():
+    breaker = make_breaker(FakeClock())
+
+    assert breaker.call(lambda: 7) == 7
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_opens_after_consecutive_failures():
+    breaker = make_breaker(FakeClock())
+    trip(breaker)
+
+    assert breaker.state == CircuitState.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 7)
+    assert breaker.snapshot()["total_rejections"] == 1
+
+
+def test_success_resets_failure_count():
+    breaker = make_breaker(FakeClock())
+
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    breaker.call(lambda: 1)
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_half_open_probe_closes_on_success():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    trip(breaker)
+
+    clock.now = 10.0
+    assert breaker.state == CircuitState.HALF_OPEN
+    assert breaker.call(lambda: 3) == 3
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_half_open_probe_reopens_on_failure():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    trip(breaker)
+
+    clock.now = 10.0
+    with pytest.raises(RuntimeError):
+        breaker.call(fail)
+    assert breaker.state == CircuitState.OPEN
+
+    clock.now = 15.0
+    assert breaker.state == CircuitState.OPEN
+    clock.now = 20.0
+    assert breaker.state == CircuitState.HALF_OPEN
+
+
+def test_only_one_probe_in_half_open():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+    trip(breaker)
+    clock.now = 10.0
+
+    def probe_with_concurrent_call() -> int:
+        with pytest.raises(CircuitOpenError):
+            breaker.call(lambda: 1)
+        return 2
+
+    assert breaker.call(probe_with_concurrent_call) == 2
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_slow_calls_count_as_failures():
+    clock = FakeClock()
+    breaker = make_breaker(clock, latency_budget=0.5)
+
+    def slow() -> int:
+        clock.now += 1.0
+        return 5
+
+    assert breaker.call(slow) == 5
+    assert breaker.call(slow) == 5
+    assert breaker.state == CircuitState.OPEN
+
+
+def test_ignored_errors_do_not_trip():
+    breaker = make_breaker(FakeClock(), ignored_errors=(ValueError,))
+
+    def invalid():
+        raise ValueError("bad input")
+
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            breaker.call(invalid)
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_invalid_threshold():
+    with pytest.raises(ValueError):
+        CircuitBreaker("test", failure_threshold=0)
+
+
+def test_errors_filtered_by_is_failure_do_not_trip():
+    breaker = make_breaker(FakeClock(), is_failure=lambda error: not isinstance(error, KeyError))
+
+    def bad_request():
+        raise KeyError("missing")
+
+    for _ in range(breaker.failure_threshold + 1):
+        with pytest.raises(KeyError):
+            breaker.call(bad_request)
+
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.parametrize(
+    "error, counts",
+    [
+        (OperationalError("SELECT 1", {}, Exception("server closed the connection")), True),
+        (PoolTimeoutError("QueuePool limit reached"), True),
+        (ConnectionRefusedError(), True),
+        (DataError("INSERT", {}, Exception("value too long")), False),
+        (IntegrityError("INSERT", {}, Exception("duplicate key")), False),
+        (ProgrammingError("SELECT", {}, Exception("relation does not exist")), False),
+        (ValueError("bad input"), False),
+    ],
+)
+def test_only_availability_errors_count_for_the_database(error, counts):
+    """Test that the database breaker only opens for errors meaning the database is unavailable"""
+    assert is_availability_error(error) is counts
+
+
+def test_invalidated_connection_counts():
+    error = ProgrammingError("SELECT 1", {}, Exception("connection lost"), connection_invalidated=True)
+    assert is_availability_error(error)
@@ -0,0 +1,76 @@
+import pytest
+from nicegui.testing import User
+from app.database import reset_db
+from app.client_metrics import ClientMetrics, estimate_element_bytes, get_process_memory_bytes
+
+
+@pytest.fixture
+def new_db():
+    """Fixture to provide a fresh database for each test"""
+    reset_db()
+    yield
+    reset_db()
+
+
+def test_process_memory_is_reported():
+    """Test that the process memory reading is a positive byte count"""
+    assert get_process_memory_bytes() > 0
+
+
+def test_collect_without_clients():
+    """Test that metrics can be collected even if no page was opened"""
+    metrics = ClientMetrics.collect()
+
+    assert metrics["process_memory_bytes"] > 0
+    assert metrics["client_count"] == len(metrics["clients"])
+    assert metrics["total_elements"] == sum(stats["elements"] for stats in metrics["clients"])
+
+
+async def test_counter_page_client_is_reported(user: User, new_db) -> None:
+    """Test that an open counter page shows up with its element count"""
+    await user.open("/")
+    await user.should_see(marker="counter-display")
+
+    metrics = ClientMetrics.collect()
+    page_clients = [stats for stats in metrics["clients"] if stats["path"] == "/"]
+
+    assert len(page_clients) >= 1
+    stats = page_clients[-1]
+    assert stats["elements"] > 0
+    assert stats["estimated_bytes"] > 0
+
+
+async def test_client_ids_are_not_published(user: User, new_db) -> None:
+    """Test that the metrics never expose client ids, which are enough to attach to a page"""
+    await user.open("/")
+    await user.should_see(marker="counter-display")
+    assert user.client is not None
+
+    metrics = ClientMetrics.collect()
+
+    assert all("id" not in stats for stats in metrics["clients"])
+    assert user.client.id not in repr(metrics)
+
+
+async def test_counter_page_element_budget(user: User, new_db) -> None:
+    """Test that the counter page keeps a small element tree per client"""
+    await user.open("/")
+    await user.should_see(marker="counter-display")
+
+    assert user.client is not None
+    stats = ClientMetrics.get_client_stats(user.client)
+    # Page frame elements plus card, title, three labels, button row and three buttons; rates come from a shared timer
+    assert stats["elements"] <= 13
+
+
+async def test_element_estimate_follows_owned_data(user: User, new_db) -> None:
+    """Test that the estimate includes data an element holds but not the client or other elements"""
+    await user.open("/")
+    await user.should_see(marker="counter-display")
+    display = user.find(marker="counter-display").elements.pop()
+    before = estimate_element_bytes(display)
+
+    display.props["data-history"] = [str(index) * 1000 for index in range(10)]
+
+    assert estimate_element_bytes(display) - before >= 10 * 1000
+    assert before < 10_000
@@ -0,0 +1,114 @@
+import pytest
+from sqlalchemy import text
+from app import counter_queries
+from app.counter_queries import PREPARED_STATEMENT_MODES, set_prepared_statements
+from app.counter_service import CounterService
+from app.database import DATABASE_URL, ENGINE, create_db_engine, reset_db
+from app.retry import retry_with_backoff
+
+
+@pytest.fixture
+def new_db():
+    """Fixture to provide a fresh database for each test"""
+    reset_db()
+    yield
+    reset_db()
+
+
+@pytest.fixture
+def engine():
+    """Fixture to provide an engine whose connections have not prepared anything yet"""
+    engine = create_db_engine(DATABASE_URL)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def prepared_mode():
+    """Restore the configured prepared statement mode after the test"""
+    mode = counter_queries.PREPARED_STATEMENTS
+    yield set_prepared_statements
+    set_prepared_statements(mode)
+
+
+def prepared_statement_names(connection) -> set:
+    return set(connection.exec_driver_sql("SELECT name FROM pg_prepared_statements").scalars())
+
+
+@pytest.mark.parametrize("mode", PREPARED_STATEMENT_MODES)
+def test_counter_operations_in_every_mode(new_db, prepared_mode, mode):
+    """Test that all modes run the same counter queries with the same results"""
+    prepared_mode(mode)
+
+    assert CounterService.get_current_value() == 0
+    assert CounterService.increment_counter(idempotency_key="inc") == 1
+    assert CounterService.increment_counter(idempotency_key="inc") == 1
+    assert CounterService.decrement_counter() == 0
+    assert CounterService.add(5, max_value=4).applied is False
+    assert CounterService.add(4, min_value=0, max_value=4).value == 4
+    assert CounterService.compare_and_set(3, 10).applied is False
+    assert CounterService.compare_and_set(4, 10).value == 10
+    assert CounterService.reset_counter(value=2) == 2
+    assert CounterService.get_current_value() == 2
+
+
+def test_unknown_mode_rejected(prepared_mode):
+    """Test that only the documented modes are accepted"""
+    with pytest.raises(ValueError, match="Unknown prepared statement mode"):
+        prepared_mode("always")
+
+
+def test_client_mode_does_not_prepare_on_the_server(new_db, engine, prepared_mode):
+    """Test that the PgBouncer-safe default leaves no state in the server session"""
+    prepared_mode("client")
+
+    with engine.connect() as connection:
+        counter_queries.READ_VALUE.execute(connection)
+        assert prepared_statement_names(connection) == set()
+
+
+def test_server_mode_prepares_once_per_connection(new_db, engine, prepared_mode):
+    """Test that server mode prepares a query on first use and then only executes it"""
+    prepared_mode("server")
+    CounterService.get_or_create_counter()
+
+    with engine.connect() as connection:
+        assert counter_queries.READ_VALUE.execute(connection).scalar() == 0
+        assert counter_queries.READ_VALUE.execute(connection).scalar() == 0
+        assert prepared_statement_names(connection) == {"counter_read_value"}
+        assert connection.info["prepared_counter_queries"] == {"counter_read_value"}
+
+
+def test_server_mode_prepares_again_after_discard(new_db, engine, prepared_mode):
+    """Test that a session reset by the pooler is retried and the statement prepared again"""
+    prepared_mode("server")
+    CounterService.get_or_create_counter()
+
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        counter_queries.READ_VALUE.execute(connection)
+        connection.execute(text("DISCARD ALL"))
+
+        read = retry_with_backoff(lambda: counter_queries.READ_VALUE.execute(connection).scalar(), base_delay=0)
+
+        assert read == 0
+        assert connection.info["prepared_counter_queries"] == {"counter_read_value"}
+
+
+def test_server_mode_write_survives_discard(new_db, prepared_mode):
+    """Test that a write on a connection whose prepared statements were discarded is retried and applies once"""
+    prepared_mode("server")
+    # Start from a single pooled connection so the reset below hits the one the next write uses
+    ENGINE.dispose()
+    CounterService.increment_counter()
+    with ENGINE.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        connection.execute(text("DISCARD ALL"))
+
+    assert CounterService.increment_counter() == 2
+    with ENGINE.connect() as connection:
+        # The first write created the counter; after the reset only the statements of the retried write are prepared
+        assert connection.info["prepared_counter_queries"] == {
+            "counter_lookup_operation",
+            "counter_apply",
+            "counter_record_operation",
+        }
+    assert CounterService.get_current_value() == 2
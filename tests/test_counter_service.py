@@ -1,8 +1,13 @@
+import threading
 import pytest
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from sqlalchemy.exc import OperationalError
 from sqlmodel import Session, select
+from app.circuit_breaker import DB_BREAKER, CircuitOpenError
 from app.database import reset_db, ENGINE
-from app.counter_service import CounterService
-from app.models import Counter
+from app.counter_service import CounterService, IDEMPOTENCY_RETENTION
+from app.models import Counter, CounterOperation
 
 
 @pytest.fixture
@@ -228,3 +233,339 @@ class TestCounterService:
         # Get counter again and check updated_at changed
         updated_counter = CounterService.get_or_create_counter()
         assert updated_counter.updated_at > initial_updated_at
+
+
+class TestCounterIdempotency:
+    """Test suite for idempotency keys on counter operations"""
+
+    def test_repeated_key_applies_once(self, new_db):
+        """Test that retrying an operation with the same key does not double-count"""
+        first = CounterService.increment_counter(idempotency_key="click-1")
+        second = CounterService.increment_counter(idempotency_key="click-1")
+
+        assert first == 1
+        assert second == 1
+        assert CounterService.get_current_value() == 1
+
+    def test_repeated_key_returns_original_result(self, new_db):
+        """Test that a replayed key returns the value from when it was first applied"""
+        CounterService.increment_counter(idempotency_key="a")
+        CounterService.increment_counter(idempotency_key="b")
+
+        assert CounterService.increment_counter(idempotency_key="a") == 1
+        assert CounterService.get_current_value() == 2
+
+    @pytest.mark.parametrize("key", ["", "k" * 65])
+    def test_invalid_key_rejected_without_tripping_circuit(self, new_db, key):
+        """Test that keys the database cannot store fail as bad input, not as database failures"""
+        for _ in range(DB_BREAKER.failure_threshold + 1):
+            with pytest.raises(ValueError, match="idempotency_key"):
+                CounterService.increment_counter(idempotency_key=key)
+
+        assert DB_BREAKER.snapshot()["consecutive_failures"] == 0
+        assert CounterService.increment_counter(idempotency_key="k" * 64) == 1
+
+    def test_distinct_keys_apply_separately(self, new_db):
+        """Test that different keys are independent operations"""
+        CounterService.decrement_counter(idempotency_key="d-1")
+        CounterService.decrement_counter(idempotency_key="d-2")
+
+        assert CounterService.get_current_value() == -2
+
+    def test_operations_without_key_are_recorded(self, new_db):
+        """Test that operations without a key still record a generated one"""
+        CounterService.increment_counter()
+        CounterService.reset_counter()
+
+        with Session(ENGINE) as session:
+            operations = session.exec(select(CounterOperation)).all()
+            assert sorted(op.operation for op in operations) == ["increment", "reset"]
+
+    def test_key_reused_for_other_operation_raises(self, new_db):
+        """Test that reusing a key for a different operation is rejected"""
+        CounterService.increment_counter(idempotency_key="shared")
+
+        with pytest.raises(ValueError, match="already used"):
+            CounterService.reset_counter(idempotency_key="shared")
+
+        assert CounterService.get_current_value() == 1
+
+    def test_prune_removes_expired_keys(self, new_db):
+        """Test that keys older than the retention window are pruned"""
+        CounterService.increment_counter(idempotency_key="old")
+
+        assert CounterService.prune_idempotency_keys() == 0
+
+        removed = CounterService.prune_idempotency_keys(now=datetime.utcnow() + IDEMPOTENCY_RETENTION * 2)
+        assert removed == 1
+
+        # The key is forgotten, so it applies again
+        assert CounterService.increment_counter(idempotency_key="old") == 2
+
+    def test_prune_deletes_in_batches(self, new_db):
+        """Test that a large backlog of expired keys is removed batch by batch"""
+        for index in range(25):
+            CounterService.increment_counter(idempotency_key=f"old-{index}")
+
+        later = datetime.utcnow() + IDEMPOTENCY_RETENTION * 2
+        assert CounterService.prune_idempotency_keys(now=later, batch_size=10) == 25
+        with Session(ENGINE) as session:
+            assert session.exec(select(CounterOperation)).first() is None
+
+    def test_prune_keeps_up_with_a_large_backlog(self, new_db):
+        """Test that one run removes far more keys than a fixed number of batches would, as long as time allows"""
+        expired_at = datetime.utcnow() - IDEMPOTENCY_RETENTION * 2
+        with Session(ENGINE) as session:
+            session.add_all(
+                CounterOperation(
+                    idempotency_key=f"old-{index}", operation="increment", result_value=1, created_at=expired_at
+                )
+                for index in range(1500)
+            )
+            session.commit()
+
+        # 150 full batches, more than the old cap of 100 batches per run
+        assert CounterService.prune_idempotency_keys(batch_size=10) == 1500
+        with Session(ENGINE) as session:
+            assert session.exec(select(CounterOperation)).first() is None
+
+    def test_prune_stops_at_time_budget(self, new_db):
+        """Test that a run past its time budget stops after the current batch and the next run continues"""
+        for index in range(25):
+            CounterService.increment_counter(idempotency_key=f"old-{index}")
+
+        later = datetime.utcnow() + IDEMPOTENCY_RETENTION * 2
+        assert CounterService.prune_idempotency_keys(now=later, batch_size=10, time_budget=0) == 10
+        assert CounterService.prune_idempotency_keys(now=later, batch_size=10) == 15
+
+    def test_writes_do_not_prune(self, new_db):
+        """Test that pruning is left to the background timer instead of running in the write path"""
+        with Session(ENGINE) as session:
+            expired_at = datetime.utcnow() - IDEMPOTENCY_RETENTION * 2
+            session.add(
+                CounterOperation(
+                    idempotency_key="expired", operation="increment", result_value=1, created_at=expired_at
+                )
+            )
+            session.commit()
+
+        CounterService.increment_counter()
+
+        with Session(ENGINE) as session:
+            assert session.get(CounterOperation, "expired") is not None
+
+
+def trip_database_circuit():
+    """Open the database circuit breaker by feeding it failing calls"""
+
+    def fail():
+        raise OperationalError("SELECT 1", {}, Exception("database down"))
+
+    for _ in range(DB_BREAKER.failure_threshold):
+        with pytest.raises(OperationalError):
+            DB_BREAKER.call(fail)
+
+
+@pytest.fixture
+def open_circuit(new_db):
+    """Fixture that opens the database circuit breaker for the duration of a test"""
+    DB_BREAKER.reset()
+    trip_database_circuit()
+    yield
+    DB_BREAKER.reset()
+
+
+class TestCounterStaleReads:
+    """Test suite for the stale-read fallback while the database circuit is open"""
+
+    def test_reading_is_fresh_when_closed(self, new_db):
+        """Test that readings come from the database while the circuit is closed"""
+        CounterService.increment_counter()
+
+        reading = CounterService.get_reading()
+
+        assert reading.value == 1
+        assert not reading.stale
+
+    def test_reading_falls_back_to_last_known_value(self, new_db):
+        """Test that an open circuit serves the last known value marked stale"""
+        CounterService.increment_counter()
+        CounterService.increment_counter()
+
+        trip_database_circuit()
+        try:
+            reading = CounterService.get_reading()
+        finally:
+            DB_BREAKER.reset()
+
+        assert reading.value == 2
+        assert reading.stale
+
+    def test_writes_fail_fast_when_open(self, open_circuit):
+        """Test that writes are rejected without touching the database while the circuit is open"""
+        with pytest.raises(CircuitOpenError):
+            CounterService.increment_counter()
+
+        DB_BREAKER.reset()
+        assert CounterService.get_current_value() == 0
+
+
+class TestConditionalUpdates:
+    """Test suite for compare-and-set and bounded add"""
+
+    def test_compare_and_set_applies_when_expected_matches(self, new_db):
+        """Test that compare_and_set writes when the counter holds the expected value"""
+        CounterService.increment_counter()
+
+        result = CounterService.compare_and_set(expected=1, new=10)
+
+        assert result.applied
+        assert result.value == 10
+        assert CounterService.get_current_value() == 10
+
+    def test_compare_and_set_rejects_stale_expectation(self, new_db):
+        """Test that compare_and_set leaves the counter alone and reports the current value on mismatch"""
+        CounterService.increment_counter()
+        CounterService.increment_counter()
+
+        result = CounterService.compare_and_set(expected=1, new=10)
+
+        assert not result.applied
+        assert result.value == 2
+        assert CounterService.get_current_value() == 2
+
+    def test_compare_and_set_on_missing_counter(self, new_db):
+        """Test that a missing counter is treated as 0"""
+        assert not CounterService.compare_and_set(expected=5, new=6).applied
+
+        result = CounterService.compare_and_set(expected=0, new=3)
+        assert result.applied
+        assert CounterService.get_current_value() == 3
+
+    def test_add_within_bounds(self, new_db):
+        """Test that add applies when the result stays in range"""
+        CounterService.get_or_create_counter()
+
+        result = CounterService.add(5, min_value=0, max_value=10)
+
+        assert result.applied
+        assert result.value == 5
+
+    def test_add_stops_at_max(self, new_db):
+        """Test that add refuses to go above max_value"""
+        CounterService.reset_counter(value=99)
+
+        assert CounterService.add(1, max_value=100).applied
+        result = CounterService.add(1, max_value=100)
+
+        assert not result.applied
+        assert result.value == 100
+        assert CounterService.get_current_value() == 100
+
+    def test_add_stops_at_min(self, new_db):
+        """Test that add refuses to go below min_value"""
+        CounterService.get_or_create_counter()
+
+        result = CounterService.add(-1, min_value=0)
+
+        assert not result.applied
+        assert result.value == 0
+
+    def test_add_moves_back_into_range(self, new_db):
+        """Test that a value above max_value can still be decremented but not incremented"""
+        CounterService.reset_counter(value=150)
+
+        result = CounterService.add(-1, min_value=0, max_value=100)
+        assert result.applied
+        assert result.value == 149
+
+        result = CounterService.add(1, min_value=0, max_value=100)
+        assert not result.applied
+        assert result.value == 149
+
+    def test_add_below_min_checks_only_min(self, new_db):
+        """Test that a value below min_value can be incremented but a decrement is refused"""
+        CounterService.reset_counter(value=-5)
+
+        assert not CounterService.add(-1, min_value=0, max_value=10).applied
+        assert CounterService.add(1, min_value=0, max_value=10).value == -4
+
+    def test_add_on_missing_counter(self, new_db):
+        """Test that add creates the counter only if the first value is in range"""
+        assert not CounterService.add(5, max_value=3).applied
+        assert CounterService.add(2, max_value=3).value == 2
+
+    def test_add_unbounded(self, new_db):
+        """Test that add without bounds behaves like a plain increment by delta"""
+        CounterService.add(3)
+        result = CounterService.add(-7)
+
+        assert result.applied
+        assert result.value == -4
+
+    def test_add_rejects_inverted_bounds(self, new_db):
+        """Test that min_value above max_value is rejected"""
+        with pytest.raises(ValueError):
+            CounterService.add(1, min_value=5, max_value=1)
+
+    def test_add_is_idempotent(self, new_db):
+        """Test that a replayed key of an applied add is not applied twice"""
+        first = CounterService.add(1, max_value=10, idempotency_key="bounded-1")
+        second = CounterService.add(1, max_value=10, idempotency_key="bounded-1")
+
+        assert first.applied and second.applied
+        assert second.value == 1
+        assert CounterService.get_current_value() == 1
+
+    def test_unapplied_add_can_be_retried(self, new_db):
+        """Test that an add that did not apply leaves its key unused"""
+        CounterService.reset_counter(value=10)
+        assert not CounterService.add(1, max_value=10, idempotency_key="later").applied
+
+        CounterService.reset_counter(value=5)
+        result = CounterService.add(1, max_value=10, idempotency_key="later")
+
+        assert result.applied
+        assert result.value == 6
+
+    def test_reset_to_value(self, new_db):
+        """Test that reset accepts a target value"""
+        assert CounterService.reset_counter(value=7) == 7
+        assert CounterService.get_current_value() == 7
+
+    def test_concurrent_bounded_adds_never_overshoot(self, new_db):
+        """Test that concurrent bounded adds apply exactly up to the bound"""
+        CounterService.get_or_create_counter()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: CounterService.add(1, max_value=50), range(80)))
+
+        assert sum(result.applied for result in results) == 50
+        assert CounterService.get_current_value() == 50
+
+    @pytest.mark.parametrize("round_number", range(5))
+    def test_concurrent_writes_on_empty_table(self, new_db, round_number):
+        """Test that writers racing to create the counter all update one row"""
+        writers = 8
+        barrier = threading.Barrier(2 * writers)
+
+        def compare_and_set(_):
+            barrier.wait()
+            return CounterService.compare_and_set(expected=0, new=100)
+
+        def increment(_):
+            barrier.wait()
+            return CounterService.increment_counter()
+
+        with ThreadPoolExecutor(max_workers=2 * writers) as pool:
+            swaps = pool.map(compare_and_set, range(writers))
+            increments = pool.map(increment, range(writers))
+            applied_swaps = [result for result in swaps if result.applied]
+            list(increments)
+
+        # At most one swap found the counter at 0, and no write was lost to a second row
+        assert len(applied_swaps) <= 1
+        expected = writers + (100 if applied_swaps else 0)
+        assert CounterService.get_current_value() == expected
+        with Session(ENGINE) as session:
+            assert len(session.exec(select(Counter)).all()) == 1
@@ -0,0 +1,153 @@
+import io
+import psycopg2
+import pytest
+from pathlib import Path
+from sqlmodel import Session, SQLModel, select
+from app.counter_service import CounterService
+from app.counter_transfer import count_rows, export_table, import_table, main
+from app.database import ENGINE, create_db_engine, reset_db
+from app.models import Counter, CounterOperation
+
+
+@pytest.fixture
+def new_db():
+    """Fixture to provide a fresh database for each test"""
+    reset_db()
+    yield
+    reset_db()
+
+
+@pytest.fixture
+def sqlite_engine(tmp_path: Path):
+    """SQLite database exercising the batched fallback path"""
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'transfer.db'}")
+    SQLModel.metadata.create_all(engine)
+    yield engine
+    engine.dispose()
+
+
+def seed_operations() -> None:
+    for index in range(5):
+        CounterService.increment_counter(idempotency_key=f"seed-{index}")
+    CounterService.decrement_counter(idempotency_key="seed-down")
+
+
+class TestPostgresCopy:
+    """Test suite for COPY-based transfer on the primary database"""
+
+    @pytest.mark.parametrize("fmt", ["csv", "binary"])
+    def test_round_trip(self, new_db, fmt):
+        """Test that exported counters and history load back unchanged"""
+        seed_operations()
+        buffers = {}
+        for table in ("counters", "counter_operations"):
+            buffers[table] = io.StringIO() if fmt == "csv" else io.BytesIO()
+            export_table(table, buffers[table], fmt)
+
+        reset_db()
+        for table, buffer in buffers.items():
+            buffer.seek(0)
+            import_table(table, buffer, fmt)
+
+        assert CounterService.get_current_value() == 4
+        assert count_rows("counter_operations") == 6
+        # Replayed keys are still recognised after the import
+        assert CounterService.increment_counter(idempotency_key="seed-0") == 1
+
+    def test_id_sequence_continues_after_import(self, new_db):
+        """Test that inserts after an import do not collide with imported ids"""
+        CounterService.get_or_create_counter()
+        buffer = io.StringIO()
+        export_table("counters", buffer)
+
+        buffer.seek(0)
+        import_table("counters", buffer, truncate=True)
+
+        with Session(ENGINE) as session:
+            session.add(Counter(value=10))
+            session.commit()
+        assert count_rows("counters") == 2
+
+    def test_failed_import_keeps_existing_rows(self, new_db):
+        """Test that truncate is rolled back together with a load that fails part way"""
+        seed_operations()
+        buffer = io.StringIO()
+        export_table("counter_operations", buffer)
+        # Repeating a row makes the load fail on the primary key after the truncate
+        lines = buffer.getvalue().splitlines(keepends=True)
+        source = io.StringIO("".join(lines + lines[1:2]))
+
+        with pytest.raises(psycopg2.IntegrityError):
+            import_table("counter_operations", source, truncate=True)
+
+        assert count_rows("counter_operations") == 6
+
+    def test_csv_has_header(self, new_db):
+        """Test that CSV exports start with a header row"""
+        CounterService.get_or_create_counter()
+        buffer = io.StringIO()
+
+        assert export_table("counters", buffer) == 1
+        assert buffer.getvalue().splitlines()[0] == "id,value,created_at,updated_at"
+
+
+class TestBatchedFallback:
+    """Test suite for the batched fallback on non-Postgres backends"""
+
+    def test_round_trip(self, sqlite_engine):
+        """Test that batched export and import reproduce all rows"""
+        with Session(sqlite_engine) as session:
+            for index in range(7):
+                session.add(CounterOperation(idempotency_key=f"k{index}", operation="increment", result_value=index))
+            session.commit()
+
+        buffer = io.StringIO()
+        assert export_table("counter_operations", buffer, batch_size=3, engine=sqlite_engine) == 7
+
+        buffer.seek(0)
+        assert import_table("counter_operations", buffer, batch_size=3, engine=sqlite_engine, truncate=True) == 7
+
+        with Session(sqlite_engine) as session:
+            values = sorted(op.result_value for op in session.exec(select(CounterOperation)).all())
+        assert values == list(range(7))
+
+    def test_export_from_postgres_imports_into_fallback(self, new_db, sqlite_engine):
+        """Test that CSV written by COPY can be loaded by the fallback path"""
+        seed_operations()
+        buffer = io.StringIO()
+        export_table("counters", buffer)
+
+        buffer.seek(0)
+        import_table("counters", buffer, engine=sqlite_engine)
+
+        with Session(sqlite_engine) as session:
+            counter = session.exec(select(Counter)).first()
+            assert counter is not None
+            assert counter.value == 4
+
+    def test_binary_requires_postgres(self, sqlite_engine):
+        """Test that binary format is rejected on non-Postgres backends"""
+        with pytest.raises(ValueError, match="Postgres"):
+            export_table("counters", io.BytesIO(), "binary", engine=sqlite_engine)
+
+
+def test_unknown_table():
+    with pytest.raises(ValueError, match="Unknown table"):
+        export_table("users", io.StringIO())
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError, match="Unknown format"):
+        export_table("counters", io.StringIO(), "parquet")
+
+
+def test_cli_round_trip(new_db, tmp_path: Path):
+    """Test the command line entry point exporting and re-importing with truncate"""
+    seed_operations()
+    path = tmp_path / "counters.csv"
+
+    assert main(["export", "counters", str(path)]) == 0
+    CounterService.reset_counter()
+    assert main(["import", "counters", str(path), "--truncate", "--batch-size", "100"]) == 0
+
+    assert CounterService.get_current_value() == 4
@@ -1,5 +1,13 @@
+import asyncio
+import threading
+import time
 import pytest
+from app.models import CounterReading
+from sqlalchemy.exc import OperationalError
+from nicegui import ui
 from nicegui.testing import User
+import app.counter_ui
+from app.circuit_breaker import DB_BREAKER
 from app.database import reset_db
 from app.counter_service import CounterService
 
@@ -29,26 +37,26 @@ class TestCounterUI:
         await user.should_see(marker="reset-button")
 
         # Check counter display shows 0 initially
-        await user.should_see("0")
+        await user.should_see(marker="counter-display", content="0")
 
     async def test_increment_button_functionality(self, user: User, new_db) -> None:
         """Test that increment button works correctly"""
         await user.open("/")
 
         # Initial state should be 0
-        await user.should_see("0")
+        await user.should_see(marker="counter-display", content="0")
 
         # Click increment button
         user.find(marker="increment-button").click()
-        await user.should_see("1")
+        await user.should_see(marker="counter-display", content="1")
 
         # Click increment again
         user.find(marker="increment-button").click()
-        await user.should_see("2")
+        await user.should_see(marker="counter-display", content="2")
 
         # Click increment one more time
         user.find(marker="increment-button").click()
-        await user.should_see("3")
+        await user.should_see(marker="counter-display", content="3")
 
         # Verify the value persists in database
         assert CounterService.get_current_value() == 3
@@ -58,15 +66,15 @@ class TestCounterUI:
         await user.open("/")
 
         # Initial state should be 0
-        await user.should_see("0")
+        await user.should_see(marker="counter-display", content="0")
 
         # Click decrement button - should go negative
         user.find(marker="decrement-button").click()
-        await user.should_see("-1")
+        await user.should_see(marker="counter-display", content="-1")
 
         # Click decrement again
         user.find(marker="decrement-button").click()
-        await user.should_see("-2")
+        await user.should_see(marker="counter-display", content="-2")
 
         # Verify the value persists in database
         assert CounterService.get_current_value() == -2
@@ -79,11 +87,11 @@ class TestCounterUI:
         user.find(marker="increment-button").click()
         user.find(marker="increment-button").click()
         user.find(marker="increment-button").click()
-        await user.should_see("3")
+        await user.should_see(marker="counter-display", content="3")
 
         # Click reset button
         user.find(marker="reset-button").click()
-        await user.should_see("0")
+        await user.should_see(marker="counter-display", content="0")
 
         # Verify the value persists in database
         assert CounterService.get_current_value() == 0
@@ -96,11 +104,11 @@ class TestCounterUI:
         user.find(marker="decrement-button").click()
         user.find(marker="decrement-button").click()
         user.find(marker="decrement-button").click()
-        await user.should_see("-3")
+        await user.should_see(marker="counter-display", content="-3")
 
         # Click reset button
         user.find(marker="reset-button").click()
-        await user.should_see("0")
+        await user.should_see(marker="counter-display", content="0")
 
         # Verify the value persists in database
         assert CounterService.get_current_value() == 0
@@ -112,25 +120,25 @@ class TestCounterUI:
         # Start with increments
         user.find(marker="increment-button").click()
         user.find(marker="increment-button").click()
-        await user.should_see("2")
+        await user.should_see(marker="counter-display", content="2")
 
         # Then decrements
         user.find(marker="decrement-button").click()
-        await user.should_see("1")
+        await user.should_see(marker="counter-display", content="1")
 
         # More increments
         user.find(marker="increment-button").click()
         user.find(marker="increment-button").click()
         user.find(marker="increment-button").click()
-        await user.should_see("4")
+        await user.should_see(marker="counter-display", content="4")
 
         # Reset
         user.find(marker="reset-button").click()
-        await user.should_see("0")
+        await user.should_see(marker="counter-display", content="0")
 
         # Decrement to negative
         user.find(marker="decrement-button").click()
-        await user.should_see("-1")
+        await user.should_see(marker="counter-display", content="-1")
 
         # Final verification
         assert CounterService.get_current_value() == -1
@@ -148,14 +156,14 @@ class TestCounterUI:
         await user.open("/")
 
         # Should show existing value, not 0
-        await user.should_see("5")
+        await user.should_see(marker="counter-display", content="5")
 
         # Operations should work from this existing value
         user.find(marker="increment-button").click()
-        await user.should_see("6")
+        await user.should_see(marker="counter-display", content="6")
 
         user.find(marker="decrement-button").click()
-        await user.should_see("5")
+        await user.should_see(marker="counter-display", content="5")
 
     async def test_ui_elements_styling(self, user: User, new_db) -> None:
         """Test that UI elements have proper styling and structure"""
@@ -170,13 +178,13 @@ class TestCounterUI:
         # Verify button functionality (text content verification is tricky with NiceGUI elements)
         # Instead verify the buttons work correctly
         user.find(marker="increment-button").click()
-        await user.should_see("1")
+        await user.should_see(marker="counter-display", content="1")
 
         user.find(marker="decrement-button").click()
-        await user.should_see("0")
+        await user.should_see(marker="counter-display", content="0")
 
         user.find(marker="reset-button").click()
-        await user.should_see("0")
+        await user.should_see(marker="counter-display", content="0")
 
     async def test_notifications_appear(self, user: User, new_db) -> None:
         """Test that notifications appear when buttons are clicked (smoke test)"""
@@ -184,10 +192,159 @@ class TestCounterUI:
 
         # Click buttons and ensure they work (notifications are ephemeral so we can't easily test their content)
         user.find(marker="increment-button").click()
-        await user.should_see("1")  # Counter should update
+        await user.should_see(marker="counter-display", content="1")  # Counter should update
 
         user.find(marker="decrement-button").click()
-        await user.should_see("0")  # Counter should update
+        await user.should_see(marker="counter-display", content="0")  # Counter should update
 
         user.find(marker="reset-button").click()
-        await user.should_see("0")  # Counter should stay at 0
+        await user.should_see(marker="counter-display", content="0")  # Counter should stay at 0
+
+    async def test_page_load_read_does_not_block_event_loop(self, user: User, new_db, monkeypatch) -> None:
+        """Test that a page waiting for a slow database read leaves the event loop free for other clients"""
+        release = threading.Event()
+
+        def slow_reading(session_key=None) -> CounterReading:
+            release.wait(timeout=5)
+            return CounterReading(value=7)
+
+        monkeypatch.setattr(CounterService, "get_reading", slow_reading)
+        opening = asyncio.create_task(user.open("/"))
+        started = time.monotonic()
+        await asyncio.sleep(0.1)
+        assert time.monotonic() - started < 1.0
+
+        release.set()
+        await opening
+        await user.should_see(marker="counter-display", content="7")
+
+    async def test_stale_value_shown_when_circuit_open(self, user: User, new_db) -> None:
+        """Test that the page renders the last known value marked stale while the database circuit is open"""
+        CounterService.increment_counter()
+        CounterService.increment_counter()
+
+        def fail():
+            raise OperationalError("SELECT 1", {}, Exception("database down"))
+
+        for _ in range(DB_BREAKER.failure_threshold):
+            with pytest.raises(OperationalError):
+                DB_BREAKER.call(fail)
+        try:
+            await user.open("/")
+            await user.should_see(marker="counter-display", content="2")
+            await user.should_see(marker="counter-status", content="Database unavailable")
+        finally:
+            DB_BREAKER.reset()
+
+    async def test_stale_notice_hidden_when_healthy(self, user: User, new_db) -> None:
+        """Test that the stale notice is hidden while the database is reachable"""
+        await user.open("/")
+
+        await user.should_see(marker="counter-display", content="0")
+        await user.should_not_see(marker="counter-status")
+
+    async def test_bounded_counter_stops_at_max(self, user: User, new_db) -> None:
+        """Test that configured bounds stop the counter and disable the button at the limit"""
+        app.counter_ui.create(min_value=0, max_value=2)
+        await user.open("/")
+
+        await user.should_see("Range: 0 to 2")
+        user.find(marker="increment-button").click()
+        user.find(marker="increment-button").click()
+        await user.should_see(marker="counter-display", content="2")
+
+        increment_button = user.find(marker="increment-button").elements.pop()
+        assert isinstance(increment_button, ui.button)
+        assert not increment_button.enabled
+        assert CounterService.get_current_value() == 2
+
+    async def test_bounded_counter_stops_at_min(self, user: User, new_db) -> None:
+        """Test that the decrement button is disabled at the lower bound"""
+        app.counter_ui.create(min_value=0, max_value=None)
+        await user.open("/")
+
+        await user.should_see("Range: 0 to ∞")
+        decrement_button = user.find(marker="decrement-button").elements.pop()
+        assert isinstance(decrement_button, ui.button)
+        assert not decrement_button.enabled
+
+        user.find(marker="increment-button").click()
+        await user.should_see(marker="counter-display", content="1")
+        assert decrement_button.enabled
+
+    async def test_bounded_counter_moves_back_from_out_of_range(self, user: User, new_db) -> None:
+        """Test that a value above the range can be decremented and an increment names the maximum"""
+        CounterService.reset_counter(value=150)
+        app.counter_ui.create(min_value=0, max_value=100)
+        await user.open("/")
+        await user.should_see(marker="counter-display", content="150")
+
+        increment_button = user.find(marker="increment-button").elements.pop()
+        assert isinstance(increment_button, ui.button)
+        assert not increment_button.enabled
+        user.find(marker="decrement-button").click()
+        await user.should_see(marker="counter-display", content="149")
+
+        CounterService.reset_counter(value=100)
+        user.find(marker="decrement-button").click()
+        await user.should_see(marker="counter-display", content="99")
+        # Raise the value behind the page's back so its enabled + button is refused by the maximum
+        CounterService.reset_counter(value=120)
+        user.find(marker="increment-button").click()
+        await user.should_see("Counter stays at 120, its maximum is 100")
+
+    async def test_reset_respects_bounds(self, user: User, new_db) -> None:
+        """Test that reset goes to the nearest bound when 0 is out of range"""
+        app.counter_ui.create(min_value=5, max_value=10)
+        await user.open("/")
+
+        user.find(marker="reset-button").click()
+        await user.should_see(marker="counter-display", content="5")
+        assert CounterService.get_current_value() == 5
+
+    async def test_unbounded_counter_hides_range(self, user: User, new_db) -> None:
+        """Test that no range is shown without configured bounds"""
+        await user.open("/")
+
+        await user.should_see(marker="counter-display", content="0")
+        await user.should_not_see(marker="counter-bounds")
+
+    async def test_counter_page_shows_rates(self, user: User, new_db) -> None:
+        """Test that the page shows the recent operation rates"""
+        await user.open("/")
+
+        await user.should_see(marker="counter-rates", content="/min over 15 min")
+
+    async def test_rates_are_shared_across_pages(self, user: User, new_db) -> None:
+        """Test that pages show the shared rates text instead of polling with a timer of their own"""
+        await user.open("/")
+        await user.should_see(marker="counter-rates", content="/min over 15 min")
+
+        app.counter_ui.RATES_DISPLAY.text = "42/s here · 0/min · 0.0/min over 15 min"
+        await user.should_see(marker="counter-rates", content="42/s")
+        assert user.client is not None
+        assert not any(isinstance(element, ui.timer) for element in user.client.elements.values())
+
+    def test_format_rates(self) -> None:
+        rates = {"1s": 3.0, "1m": 0.5, "15m": 0.25}
+        assert app.counter_ui.format_rates(rates) == "3/s here · 30/min · 15.0/min over 15 min"
+
+
+class TestUserCounterUI:
+    """Test suite for the per-user counter page"""
+
+    async def test_user_counter_page(self, user: User, new_db) -> None:
+        """Test that the per-user page counts separately from the global counter"""
+        await user.open("/me")
+        await user.should_see("My Counter")
+
+        user.find(marker="user-increment-button").click()
+        user.find(marker="user-increment-button").click()
+        await user.should_see(marker="user-counter-display", content="2")
+        user.find(marker="user-decrement-button").click()
+        await user.should_see(marker="user-counter-display", content="1")
+
+        assert CounterService.get_current_value() == 0
+
+        user.find(marker="user-reset-button").click()
+        await user.should_see(marker="user-counter-display", content="0")
@@ -0,0 +1,71 @@
+import threading
+import time
+import pytest
+from fastapi import HTTPException
+from nicegui.testing import User
+from app.admin import check_admin_token
+from app.profiler import SamplingProfiler
+
+
+def busy_loop(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_samples_other_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=busy_loop, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        profiler = SamplingProfiler(interval=0.001)
+        profiler.run(0.2)
+    finally:
+        stop.set()
+        worker.join()
+
+    assert profiler.sample_count > 0
+    report = profiler.collapsed()
+    busy_lines = [line for line in report.splitlines() if line.startswith("busy-worker;")]
+    assert busy_lines
+    assert any("busy_loop" in line for line in busy_lines)
+    # Each line is a collapsed stack followed by its sample count
+    stack, count = busy_lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def test_profiler_rejects_invalid_duration():
+    profiler = SamplingProfiler()
+
+    with pytest.raises(ValueError):
+        profiler.run(0)
+    with pytest.raises(ValueError):
+        profiler.run(3600)
+
+
+def test_profiler_rejects_invalid_interval():
+    with pytest.raises(ValueError):
+        SamplingProfiler(interval=0)
+
+
+def test_admin_token_check():
+    check_admin_token("secret", admin_token="secret")
+
+    with pytest.raises(HTTPException) as forbidden:
+        check_admin_token("wrong", admin_token="secret")
+    assert forbidden.value.status_code == 403
+
+    with pytest.raises(HTTPException) as missing:
+        check_admin_token(None, admin_token="secret")
+    assert missing.value.status_code == 403
+
+    with pytest.raises(HTTPException) as disabled:
+        check_admin_token("anything", admin_token="")
+    assert disabled.value.status_code == 404
+
+
+async def test_admin_endpoints_disabled_without_token(user: User) -> None:
+    started = time.monotonic()
+    response = await user.http_client.get("/admin/profile", params={"seconds": 1})
+
+    assert response.status_code == 404
+    assert time.monotonic() - started < 1.0
@@ -0,0 +1,159 @@
+import time
+import pytest
+from nicegui.testing import User
+from datetime import datetime, timedelta
+from sqlmodel import Session, select
+from app.counter_service import RATE_COUNTER, CounterService
+from app.database import ENGINE, reset_db
+from app.models import CounterRate
+from app.rate_tracker import PROCESS_ID, RATE_STALE_AFTER, RATE_TRACKER, RateTracker, merge_rates
+
+
+class FakeClock:
+    """Manually advanced clock for deterministic rate tests"""
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def new_db():
+    """Fixture to provide a fresh database for each test"""
+    reset_db()
+    yield
+    reset_db()
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
+
+
+@pytest.fixture
+def tracker(clock: FakeClock) -> RateTracker:
+    return RateTracker(clock=clock)
+
+
+def test_rates_cover_complete_seconds(tracker: RateTracker, clock: FakeClock):
+    """Test that the current, still incomplete second is not reported yet"""
+    tracker.record("counter", 3)
+    assert tracker.rates("counter") == {"1s": 0.0, "1m": 0.0, "15m": 0.0}
+
+    clock.now += 1
+    assert tracker.rates("counter") == {"1s": 3.0, "1m": 3 / 60, "15m": 3 / 900}
+
+
+def test_events_leave_each_window(tracker: RateTracker, clock: FakeClock):
+    """Test that events drop out of a window once it has passed"""
+    tracker.record("counter", 60)
+    clock.now += 2
+    assert tracker.rates("counter")["1s"] == 0.0
+    assert tracker.rates("counter")["1m"] == 1.0
+
+    clock.now += 60
+    assert tracker.rates("counter")["1m"] == 0.0
+    assert tracker.rates("counter")["15m"] == 60 / 900
+
+    clock.now += 900
+    assert tracker.rates("counter")["15m"] == 0.0
+
+
+def test_ring_slots_are_reused(tracker: RateTracker, clock: FakeClock):
+    """Test that a slot reused after the ring wrapped around starts from zero"""
+    tracker.record("counter", 5)
+    clock.now += 900
+    tracker.record("counter", 1)
+    clock.now += 1
+    assert tracker.rates("counter")["1s"] == 1.0
+    assert tracker.rates("counter")["15m"] == 1 / 900
+
+
+def test_unknown_counter_has_zero_rates(tracker: RateTracker):
+    assert tracker.rates("missing") == {"1s": 0.0, "1m": 0.0, "15m": 0.0}
+    assert tracker.all_rates() == {}
+
+
+def test_remote_events_are_added(tracker: RateTracker, clock: FakeClock):
+    """Test that totals merged from other processes count towards the rates"""
+    tracker.record("counter", 2)
+    clock.now += 1
+    tracker.set_remote_events({"counter": {"1s": 4, "1m": 58, "15m": 898}, "other": {"1s": 1, "1m": 1, "15m": 1}})
+
+    # A remote one-second total is a snapshot from the last merge, so the 1s window stays local
+    assert tracker.rates("counter") == {"1s": 2.0, "1m": 1.0, "15m": 1.0}
+    assert set(tracker.all_rates()) == {"counter", "other"}
+
+
+def test_merge_rates_across_processes(new_db, clock: FakeClock):
+    """Test that each process sees the events of the others after a merge"""
+    first, second = RateTracker(clock=clock), RateTracker(clock=clock)
+    first.record("counter", 10)
+    second.record("counter", 20)
+    clock.now += 1
+
+    merge_rates(first, ENGINE, "process-1")
+    merge_rates(second, ENGINE, "process-2")
+    merge_rates(first, ENGINE, "process-1")
+
+    assert first.rates("counter")["1m"] == 30 / 60
+    assert second.rates("counter")["1m"] == 30 / 60
+    assert first.rates("counter")["1s"] == 10.0
+
+
+def test_merge_rates_drops_stopped_processes(new_db, tracker: RateTracker):
+    """Test that totals a process stopped refreshing are deleted and no longer counted"""
+    now = datetime.utcnow()
+    with Session(ENGINE) as session:
+        stale = now - 2 * RATE_STALE_AFTER
+        session.add(CounterRate(process_id="stopped", counter="counter", events_1m=5, updated_at=stale))
+        recent = now - timedelta(seconds=1)
+        session.add(CounterRate(process_id="live", counter="counter", events_1m=7, updated_at=recent))
+        session.commit()
+
+    merge_rates(tracker, ENGINE, "self", now)
+
+    assert tracker.rates("counter")["1m"] == 7 / 60
+    with Session(ENGINE) as session:
+        assert [row.process_id for row in session.exec(select(CounterRate))] == ["live"]
+
+
+def test_counter_service_feeds_applied_operations(new_db):
+    """Test that applied operations are recorded and rejected ones are not"""
+    # Only complete seconds are reported, so wait for the seconds of earlier operations to complete
+    time.sleep(1.0)
+    before = RATE_TRACKER.local_events().get(RATE_COUNTER, {}).get("15m", 0)
+    CounterService.increment_counter()
+    CounterService.add(1, max_value=0)
+    CounterService.add(-1, min_value=0)
+
+    time.sleep(1.0)
+    assert RATE_TRACKER.local_events()[RATE_COUNTER]["15m"] - before == 2
+    assert CounterService.get_rates()["15m"] >= 2 / 900
+
+
+def test_replayed_operations_are_not_counted_again(new_db):
+    """Test that retrying an idempotency key that already applied adds no rate event"""
+    time.sleep(1.0)
+    before = RATE_TRACKER.local_events().get(RATE_COUNTER, {}).get("15m", 0)
+    CounterService.increment_counter(idempotency_key="counted-once")
+    CounterService.increment_counter(idempotency_key="counted-once")
+    assert CounterService.add(1, idempotency_key="counted-once-add").replayed is False
+    assert CounterService.add(1, idempotency_key="counted-once-add").replayed is True
+
+    time.sleep(1.0)
+    assert RATE_TRACKER.local_events()[RATE_COUNTER]["15m"] - before == 2
+
+
+async def test_rates_endpoint(user: User, new_db) -> None:
+    """Test that the rates of every counter are served as JSON"""
+    CounterService.increment_counter()
+    response = await user.http_client.get("/metrics/rates")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["process_id"] == PROCESS_ID
+    assert body["windows"] == {"1s": 1, "1m": 60, "15m": 900}
+    assert set(body["counters"][RATE_COUNTER]) == {"1s", "1m", "15m"}
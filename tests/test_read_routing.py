@@ -0,0 +1,149 @@
+import pytest
+from pathlib import Path
+from typing import Optional
+from sqlalchemy import Engine
+from sqlalchemy.exc import ProgrammingError
+from sqlmodel import Session, SQLModel
+from app.circuit_breaker import CircuitBreaker, CircuitState, is_availability_error
+from app.counter_service import CounterService
+from app.database import create_db_engine
+from app.models import Counter
+from app.read_routing import ReadRouter
+
+
+class FakeClock:
+    """Manually advanced clock for deterministic routing tests"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_sqlite_db(path: Path, value: int) -> Engine:
+    """Create a SQLite stand-in database holding a counter with the given value"""
+    engine = create_db_engine(f"sqlite:///{path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add(Counter(value=value))
+        session.commit()
+    return engine
+
+
+@pytest.fixture
+def databases(tmp_path: Path):
+    """Primary and two replicas, each holding a distinct value so the serving database is visible"""
+    primary = make_sqlite_db(tmp_path / "primary.db", 0)
+    replicas = [make_sqlite_db(tmp_path / "replica1.db", 1), make_sqlite_db(tmp_path / "replica2.db", 2)]
+    yield primary, replicas
+    for engine in [primary, *replicas]:
+        engine.dispose()
+
+
+def test_reads_use_primary_without_replicas(databases):
+    primary, _ = databases
+    router = ReadRouter(primary, [])
+
+    assert router.run_read(CounterService._read_value) == 0
+
+
+def test_reads_round_robin_across_replicas(databases):
+    primary, replicas = databases
+    router = ReadRouter(primary, replicas)
+
+    values = [router.run_read(CounterService._read_value) for _ in range(4)]
+
+    assert values == [1, 2, 1, 2]
+
+
+def test_failed_replica_fails_over(databases, tmp_path: Path):
+    primary, replicas = databases
+    broken = create_db_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    clock = FakeClock()
+    router = ReadRouter(primary, [broken, replicas[0]], replica_cooldown=30.0, clock=clock)
+
+    assert router.run_read(CounterService._read_value) == 1
+    # The broken replica is skipped during its cooldown
+    assert router.read_engines() == [replicas[0], primary]
+
+    clock.now = 30.0
+    assert broken in router.read_engines()
+
+
+def test_all_replicas_down_falls_back_to_primary(databases, tmp_path: Path):
+    primary, _ = databases
+    broken = create_db_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    router = ReadRouter(primary, [broken])
+
+    assert router.run_read(CounterService._read_value) == 0
+
+
+def test_read_your_writes_pins_session_to_primary(databases):
+    primary, replicas = databases
+    clock = FakeClock()
+    router = ReadRouter(primary, replicas, read_your_writes_window=5.0, clock=clock)
+
+    router.mark_write("browser-a")
+
+    assert router.run_read(CounterService._read_value, "browser-a") == 0
+    # Other sessions keep reading from replicas
+    assert router.run_read(CounterService._read_value, "browser-b") in (1, 2)
+
+    clock.now = 5.0
+    assert router.run_read(CounterService._read_value, "browser-a") in (1, 2)
+
+
+def test_mark_write_without_session_is_ignored(databases):
+    primary, replicas = databases
+    router = ReadRouter(primary, replicas)
+
+    router.mark_write(None)
+
+    assert router.read_engines(None)[0] in replicas
+
+
+def test_any_database_error_fails_over(databases):
+    """Test that a replica failing with a non-operational database error still fails over"""
+    primary, replicas = databases
+    router = ReadRouter(primary, [replicas[0]])
+
+    def read(engine: Engine) -> Optional[int]:
+        if engine is replicas[0]:
+            raise ProgrammingError("SELECT", {}, Exception('relation "counters" does not exist'))
+        return CounterService._read_value(engine)
+
+    assert router.run_read(read) == 0
+    assert router.read_engines() == [primary]
+
+
+def test_slow_replica_is_skipped(databases):
+    """Test that a replica read over its latency budget is served, then the replica is skipped for the cooldown"""
+    primary, replicas = databases
+    clock = FakeClock()
+    router = ReadRouter(primary, [replicas[0]], replica_cooldown=30.0, replica_latency_budget=0.1, clock=clock)
+
+    def slow_read(engine: Engine) -> Optional[int]:
+        clock.now += 0.5
+        return CounterService._read_value(engine)
+
+    assert router.run_read(slow_read) == 1
+    assert router.read_engines() == [primary]
+
+    clock.now += 30.0
+    assert router.read_engines() == [replicas[0], primary]
+
+
+def test_replica_failures_do_not_open_primary_breaker(databases, tmp_path: Path):
+    """Test that failing replicas never count against the breaker guarding the primary"""
+    primary, _ = databases
+    broken = create_db_engine(f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    clock = FakeClock()
+    breaker = CircuitBreaker("primary", failure_threshold=1, is_failure=is_availability_error, clock=clock)
+    router = ReadRouter(primary, [broken], replica_cooldown=0.0, primary_breaker=breaker, clock=clock)
+
+    for _ in range(3):
+        assert router.run_read(CounterService._read_value) == 0
+
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.snapshot()["total_failures"] == 0
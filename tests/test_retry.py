@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy.exc import IntegrityError, OperationalError, ProgrammingError
+from app.retry import backoff_delay, is_retryable, retry_with_backoff
+
+
+class FlakyOperation:
+    """Callable that fails a fixed number of times before succeeding"""
+
+    def __init__(self, failures: int, error: Exception):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self) -> int:
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return 42
+
+
+def make_operational_error() -> OperationalError:
+    return OperationalError("UPDATE counters", {}, Exception("canceling statement due to statement timeout"))
+
+
+def test_retries_until_success():
+    operation = FlakyOperation(failures=2, error=make_operational_error())
+
+    assert retry_with_backoff(operation, attempts=3, base_delay=0.0) == 42
+    assert operation.calls == 3
+
+
+def test_gives_up_after_attempts():
+    operation = FlakyOperation(failures=5, error=make_operational_error())
+
+    with pytest.raises(OperationalError):
+        retry_with_backoff(operation, attempts=2, base_delay=0.0)
+    assert operation.calls == 2
+
+
+def test_non_retryable_error_is_raised_immediately():
+    operation = FlakyOperation(failures=1, error=ValueError("bad input"))
+
+    with pytest.raises(ValueError):
+        retry_with_backoff(operation, attempts=3, base_delay=0.0)
+    assert operation.calls == 1
+
+
+def test_invalid_attempts():
+    with pytest.raises(ValueError):
+        retry_with_backoff(lambda: 1, attempts=0)
+
+
+def test_is_retryable():
+    assert is_retryable(make_operational_error())
+    assert is_retryable(IntegrityError("INSERT", {}, Exception("duplicate key")))
+    assert not is_retryable(ValueError("bad input"))
+
+
+def test_missing_prepared_statement_is_retryable():
+    class MissingStatement(Exception):
+        pgcode = "26000"
+
+    assert is_retryable(ProgrammingError("EXECUTE counter_read_value", {}, MissingStatement()))
+    assert not is_retryable(ProgrammingError("SELECT", {}, Exception("syntax error")))
+
+
+def test_backoff_delay_is_bounded():
+    for attempt in range(10):
+        delay = backoff_delay(attempt, base_delay=0.1, max_delay=0.5)
+        assert 0.0 <= delay <= 0.5
@@ -0,0 +1,136 @@
+import json
+import pytest
+from pathlib import Path
+from nicegui.testing import User
+from app import counter_queries, tracing
+from app.counter_service import CounterService
+from app.database import reset_db
+from app.tracing import FileExporter, InMemoryExporter, install_sql_tracing, set_exporter, span, traced
+
+
+@pytest.fixture
+def exporter():
+    """Collect spans in a fresh in-memory exporter and restore the previous one afterwards"""
+    previous = tracing.EXPORTER
+    collector = InMemoryExporter()
+    set_exporter(collector)
+    yield collector
+    set_exporter(previous)
+
+
+@pytest.fixture
+def new_db():
+    """Fixture to provide a fresh database for each test"""
+    reset_db()
+    yield
+    reset_db()
+
+
+def test_nested_spans_share_trace(exporter):
+    with span("outer", kind="test") as outer:
+        with span("inner") as inner:
+            pass
+
+    assert outer is not None and inner is not None
+    assert inner.trace_id == outer.trace_id
+    assert inner.parent_id == outer.span_id
+    assert outer.parent_id is None
+    assert outer.attributes == {"kind": "test"}
+    # Spans are exported when they finish, innermost first
+    assert [s.name for s in exporter.spans()] == ["inner", "outer"]
+
+
+def test_span_records_errors(exporter):
+    with pytest.raises(ValueError):
+        with span("failing"):
+            raise ValueError("boom")
+
+    (recorded,) = exporter.spans()
+    assert recorded.error == "ValueError: boom"
+    assert recorded.duration_ms >= 0.0
+
+
+def test_traced_decorator(exporter):
+    @traced("double")
+    def double(value: int) -> int:
+        return value * 2
+
+    assert double(4) == 8
+    assert [s.name for s in exporter.spans()] == ["double"]
+
+
+def test_disabled_tracing_records_nothing(exporter):
+    set_exporter(None)
+
+    with span("ignored") as recorded:
+        pass
+
+    assert recorded is None
+    assert exporter.spans() == []
+
+
+def test_buffer_is_bounded():
+    collector = InMemoryExporter(max_spans=3)
+    previous = tracing.EXPORTER
+    set_exporter(collector)
+    try:
+        for index in range(5):
+            with span(f"span-{index}"):
+                pass
+    finally:
+        set_exporter(previous)
+
+    assert [s.name for s in collector.spans()] == ["span-2", "span-3", "span-4"]
+
+
+def test_file_exporter_writes_json_lines(tmp_path: Path):
+    path = tmp_path / "spans.jsonl"
+    previous = tracing.EXPORTER
+    set_exporter(FileExporter(path))
+    try:
+        with span("to-file", answer=42):
+            pass
+    finally:
+        set_exporter(previous)
+
+    (line,) = path.read_text().splitlines()
+    record = json.loads(line)
+    assert record["name"] == "to-file"
+    assert record["attributes"] == {"answer": 42}
+
+
+def test_service_and_sql_spans_form_one_trace(new_db, exporter, monkeypatch):
+    # Server-side prepared statements would trace as EXECUTE on connections that prepared them earlier
+    monkeypatch.setattr(counter_queries, "PREPARED_STATEMENTS", "client")
+    install_sql_tracing()
+
+    CounterService.increment_counter()
+
+    spans = exporter.spans()
+    (root,) = [s for s in spans if s.name == "counter_service.increment_counter"]
+    sql_spans = [s for s in spans if s.name == "sql" and s.trace_id == root.trace_id]
+    assert sql_spans
+    assert any("INSERT INTO counter_operations" in s.attributes["statement"] for s in sql_spans)
+    assert exporter.spans(root.trace_id) == [s for s in spans if s.trace_id == root.trace_id]
+
+
+async def test_click_handler_service_and_sql_spans_form_one_trace(user: User, new_db, exporter, monkeypatch):
+    """Test that a click's handler span is the root of the service and SQL spans it causes in a worker thread"""
+    monkeypatch.setattr(counter_queries, "PREPARED_STATEMENTS", "client")
+    install_sql_tracing()
+    await user.open("/")
+    await user.should_see(marker="counter-display", content="0")
+    exporter.clear()
+
+    user.find(marker="increment-button").click()
+    await user.should_see(marker="counter-display", content="1")
+
+    spans = exporter.spans()
+    (handler,) = [s for s in spans if s.name == "ui.handle_increment"]
+    (service,) = [s for s in spans if s.name == "counter_service.add"]
+    sql_spans = [s for s in spans if s.name == "sql"]
+    assert handler.parent_id is None
+    assert service.trace_id == handler.trace_id
+    assert service.parent_id == handler.span_id
+    assert sql_spans
+    assert all(s.trace_id == handler.trace_id for s in sql_spans)
@@ -0,0 +1,84 @@
+import pytest
+from sqlalchemy import text
+from sqlmodel import Session, select
+from app.database import ENGINE, reset_db
+from app.models import USER_COUNTER_PARTITIONS, UserCounter
+from app.user_counter_service import UserCounterService
+
+
+@pytest.fixture
+def new_db():
+    """Fixture to provide a fresh database for each test"""
+    reset_db()
+    yield
+    reset_db()
+
+
+class TestUserCounterService:
+    """Test suite for UserCounterService"""
+
+    def test_unknown_user_reads_zero_without_row(self, new_db):
+        """Test that reading a new user's counter does not create a row"""
+        assert UserCounterService.get_value("alice") == 0
+
+        with Session(ENGINE) as session:
+            assert session.exec(select(UserCounter)).first() is None
+
+    def test_add_creates_and_updates(self, new_db):
+        """Test that add upserts the user's counter"""
+        assert UserCounterService.add("alice", 1) == 1
+        assert UserCounterService.add("alice", 4) == 5
+        assert UserCounterService.add("alice", -7) == -2
+        assert UserCounterService.get_value("alice") == -2
+
+    def test_users_are_independent(self, new_db):
+        """Test that users do not see each other's counts"""
+        UserCounterService.add("alice", 3)
+        UserCounterService.add("bob", 10)
+
+        assert UserCounterService.get_value("alice") == 3
+        assert UserCounterService.get_value("bob") == 10
+
+    def test_reset(self, new_db):
+        """Test that reset sets an existing or missing counter to 0"""
+        UserCounterService.add("alice", 3)
+
+        assert UserCounterService.reset("alice") == 0
+        assert UserCounterService.reset("carol") == 0
+        assert UserCounterService.get_value("alice") == 0
+
+    @pytest.mark.parametrize("user_id", ["", "x" * 65])
+    def test_invalid_user_id(self, new_db, user_id):
+        """Test that empty or overlong user ids are rejected"""
+        with pytest.raises(ValueError):
+            UserCounterService.add(user_id, 1)
+
+    def test_table_is_hash_partitioned(self, new_db):
+        """Test that user_counters is split into hash partitions holding the rows"""
+        for index in range(50):
+            UserCounterService.add(f"user-{index}", 1)
+
+        with ENGINE.connect() as connection:
+            partitions = connection.execute(
+                text("SELECT count(*) FROM pg_inherits WHERE inhparent = 'user_counters'::regclass")
+            ).scalar_one()
+            used = connection.execute(text("SELECT count(DISTINCT tableoid) FROM user_counters")).scalar_one()
+
+        assert partitions == USER_COUNTER_PARTITIONS
+        assert 1 < used <= USER_COUNTER_PARTITIONS
+
+    def test_lookup_uses_single_partition_index_only_scan(self, new_db):
+        """Test that a user's read is an index-only scan on one partition"""
+        UserCounterService.add("alice", 1)
+
+        with ENGINE.connect() as connection:
+            connection.execute(text("SET enable_seqscan = off"))
+            plan = "\n".join(
+                row[0]
+                for row in connection.execute(
+                    text("EXPLAIN SELECT value FROM user_counters WHERE user_id = :user_id"), {"user_id": "alice"}
+                )
+            )
+
+        assert "Index Only Scan" in plan
+        assert plan.count(" on user_counters_p") == 1